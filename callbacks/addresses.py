@@ -6,7 +6,7 @@ from callbacks.base import handle_cancel
 from callbacks.clusters import handle_view_cluster_addresses
 from exceptions import NotExist, InvalidName
 from handlers.bot_handlers import KeyboardConstructor
-from handlers.database_handlers import AddressesHandler, ClusterHandler
+from handlers.async_database_handlers import AsyncAddressesHandler, AsyncClusterHandler
 from handlers.kafka_handlers import send_data
 from handlers.states import AddAddressState, RenameAddressState
 from logger import LOGGER
@@ -22,7 +22,7 @@ async def get_address(message: types.Message, state: FSMContext):
         await state.set_state(AddAddressState.blockchain)
         msg = 'Choose blockchain'
         try:
-            chains = AddressesHandler().get_blockchains()
+            chains = await AsyncAddressesHandler().get_blockchains()
         except Exception as e:
             LOGGER.error(str(e))
         else:
@@ -55,13 +55,13 @@ async def get_name(message: types.Message, state: FSMContext):
         data = await state.get_data()
         cluster_id, wallet, blockchain = data.values()
         if cluster_id is None:
-            cluster_handler = ClusterHandler()
-            cluster_id = cluster_handler.add_cluster(message.from_user.id, message.text)
+            cluster_handler = AsyncClusterHandler()
+            cluster_id = await cluster_handler.add_cluster(message.from_user.id, message.text)
 
         name = message.text
-        handler = AddressesHandler()
+        handler = AsyncAddressesHandler()
         try:
-            handler.add_address(cluster_id, wallet, blockchain, name)
+            await handler.add_address(cluster_id, wallet, blockchain, name)
             await send_data('add_address', wallet, blockchain, cluster_id=cluster_id)
         except (NotExist, InvalidName) as e:
             msg = str(e)
@@ -71,16 +71,14 @@ async def get_name(message: types.Message, state: FSMContext):
             buttons = KeyboardConstructor.get_base_reply_keyboard()
             await state.reset_state(with_data=True)
             await message.answer(msg, reply_markup=buttons)
-        finally:
-            handler.session.dispose()
 
 
 async def handle_address_detail(message: types.Message):
     """Handle detail info about address"""
     address_id = int(message.text.rsplit('_', 1)[1])
-    handler = AddressesHandler()
+    handler = AsyncAddressesHandler()
     try:
-        address = handler.get_address_by_id(address_id)
+        address = await handler.get_address_by_id(address_id)
     except NotExist as e:
         msg = str(e)
         markup = KeyboardConstructor.get_base_reply_keyboard()
@@ -92,8 +90,6 @@ async def handle_address_detail(message: types.Message):
         else:
             msg, markup = KeyboardConstructor.get_address_detail(address)
         await message.answer(msg, reply_markup=markup, disable_web_page_preview=True)
-    finally:
-        handler.session.dispose()
 
 
 async def handle_rename_address(callback: types.CallbackQuery, state: FSMContext):
@@ -112,9 +108,9 @@ async def handle_rename_address_set_name(message: types.Message, state: FSMConte
         await handle_cancel(message, state)
     else:
         data = await state.get_data()
-        handler = AddressesHandler()
+        handler = AsyncAddressesHandler()
         try:
-            handler.rename_address(data['link_id'], message.text)
+            await handler.rename_address(data['link_id'], message.text)
         except (NotExist, InvalidName) as e:
             await message.answer(str(e))
         else:
@@ -124,16 +120,14 @@ async def handle_rename_address_set_name(message: types.Message, state: FSMConte
             msg = 'Success'
             await message.answer(msg, reply_markup=markup)
             await handle_address_detail(message)
-        finally:
-            handler.session.dispose()
 
 
 async def handle_mute_address(callback: types.CallbackQuery):
     """Toggle mute/unmute address"""
     data = CallbackDataModel.parse_raw(callback.data)
-    handler = AddressesHandler()
+    handler = AsyncAddressesHandler()
     try:
-        address = handler.toggle_mute_address(data.id)
+        address = await handler.toggle_mute_address(data.id)
     except NotExist as e:
         msg = str(e)
         markup = KeyboardConstructor.get_base_reply_keyboard()
@@ -145,16 +139,14 @@ async def handle_mute_address(callback: types.CallbackQuery):
         await callback.message.edit_text(msg)
         await callback.message.edit_reply_markup(markup)
         await callback.answer('Success')
-    finally:
-        handler.session.dispose()
 
 
 async def handle_delete_address(callback: types.CallbackQuery):
     """Delete address from cluster"""
     data = CallbackDataModel.parse_raw(callback.data)
-    handler = AddressesHandler()
+    handler = AsyncAddressesHandler()
     try:
-        cluster_id, deleted = handler.delete_address(data.id)
+        cluster_id, deleted = await handler.delete_address(data.id)
         if deleted:
             address, blockchain = deleted
             await send_data(action='delete_address', wallet=address, blockchain_id=blockchain, cluster_id=cluster_id)
@@ -165,5 +157,3 @@ async def handle_delete_address(callback: types.CallbackQuery):
         await handle_view_cluster_addresses(callback)
     except Exception as e:
         LOGGER.error(str(e))
-    finally:
-        handler.session.dispose()
@@ -3,7 +3,7 @@ from aiogram import types
 from aiogram.dispatcher import FSMContext
 
 from handlers.bot_handlers import KeyboardConstructor
-from handlers.database_handlers import UsersHandler
+from handlers.async_database_handlers import AsyncUsersHandler
 from logger import LOGGER
 from schema.text_messages import TextMessages
 
@@ -18,12 +18,12 @@ async def handle_cancel(message: types.Message, state: FSMContext):
 
 async def handle_start(message: types.Message):
     """Handle 'start' command"""
-    handler = UsersHandler()
+    handler = AsyncUsersHandler()
     try:
         user_id = message.from_user.id
-        user = handler.get_user_by_id(user_id)
+        user = await handler.get_user_by_id(user_id)
         if not user:
-            handler.add_user(user_id)
+            await handler.add_user(user_id)
 
         msg = TextMessages.get_message('start')
         buttons = KeyboardConstructor.get_base_reply_keyboard()
@@ -31,5 +31,3 @@ async def handle_start(message: types.Message):
         await message.answer(msg.text.format(message.from_user.full_name), reply_markup=buttons)
     except Exception as e:
         LOGGER.error(str(e))
-    finally:
-        handler.session.dispose()
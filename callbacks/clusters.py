@@ -6,7 +6,7 @@ from callbacks.base import handle_cancel
 from callbacks.main_menu import handle_groups
 from exceptions import NotExist, InvalidName
 from handlers.bot_handlers import KeyboardConstructor
-from handlers.database_handlers import ClusterHandler
+from handlers.async_database_handlers import AsyncClusterHandler
 from handlers.states import RenameClusterState, AddAddressState
 from logger import LOGGER
 from schema.bot_schema import CallbackDataModel
@@ -17,9 +17,9 @@ async def handle_view_cluster_addresses(callback: types.CallbackQuery):
     """Handle cluster addresses list"""
     data = CallbackDataModel.parse_raw(callback.data)
     page = data.data.get('page')
-    handler = ClusterHandler()
+    handler = AsyncClusterHandler()
     try:
-        cluster = handler.get_cluster_by_id(data.id)
+        cluster = await handler.get_cluster_by_id(data.id)
         if not cluster:
             await callback.answer('Cluster not exist')
             callback.message.from_user = callback.from_user
@@ -30,8 +30,6 @@ async def handle_view_cluster_addresses(callback: types.CallbackQuery):
             await callback.message.answer(msg, reply_markup=markup)
     except Exception as e:
         LOGGER.error(str(e))
-    finally:
-        handler.session.dispose()
 
 
 async def handle_rename_cluster(callback: types.CallbackQuery, state: FSMContext):
@@ -50,9 +48,9 @@ async def handle_rename_cluster_set_name(message: types.Message, state: FSMConte
         await handle_cancel(message, state)
     else:
         data = await state.get_data()
-        handler = ClusterHandler()
+        handler = AsyncClusterHandler()
         try:
-            handler.rename_cluster(data['cluster_id'], message.text)
+            await handler.rename_cluster(data['cluster_id'], message.text)
         except (NotExist, InvalidName) as e:
             await message.answer(str(e))
         else:
@@ -62,16 +60,14 @@ async def handle_rename_cluster_set_name(message: types.Message, state: FSMConte
             msg = 'Success'
             await message.answer(msg, reply_markup=markup)
             await handle_cluster_detail(message)
-        finally:
-            handler.session.dispose()
 
 
 async def handle_cluster_detail(message: types.Message):
     """Handle cluster detail"""
     cluster_id = message.text.rsplit('_', 1)[1]
-    handler = ClusterHandler()
+    handler = AsyncClusterHandler()
     try:
-        cluster = handler.get_cluster_by_id(int(cluster_id))
+        cluster = await handler.get_cluster_by_id(int(cluster_id))
         if not cluster or cluster.user_id != int(message.from_user.id):
             await message.answer('Cluster not exist')
             await handle_groups(message)
@@ -80,8 +76,6 @@ async def handle_cluster_detail(message: types.Message):
             await message.answer(msg, reply_markup=markup)
     except Exception as e:
         LOGGER.error(str(e))
-    finally:
-        handler.session.dispose()
 
 
 async def add_group(message: types.Message, state: FSMContext):
@@ -90,25 +84,23 @@ async def add_group(message: types.Message, state: FSMContext):
         await handle_cancel(message, state)
 
     else:
-        handler = ClusterHandler()
+        handler = AsyncClusterHandler()
         try:
-            handler.add_cluster(message.from_user.id, message.text)
+            await handler.add_cluster(message.from_user.id, message.text)
         except (NotExist, InvalidName) as e:
             await message.answer(str(e))
         else:
             buttons = KeyboardConstructor.get_base_reply_keyboard()
             await state.reset_state(with_data=True)
             await message.answer('Success', reply_markup=buttons)
-        finally:
-            handler.session.dispose()
 
 
 async def handle_mute_cluster(callback: types.CallbackQuery):
     """Toggle mute/unmute cluster"""
     data = CallbackDataModel.parse_raw(callback.data)
-    handler = ClusterHandler()
+    handler = AsyncClusterHandler()
     try:
-        cluster = handler.toggle_mute(data.id)
+        cluster = await handler.toggle_mute(data.id)
         if not cluster:
             await callback.answer('Cluster not exist')
             callback.message.from_user = callback.from_user
@@ -121,24 +113,38 @@ async def handle_mute_cluster(callback: types.CallbackQuery):
             await callback.answer('Success')
     except Exception as e:
         LOGGER.error(str(e))
-    finally:
-        handler.session.dispose()
+
+
+async def handle_digest_cluster(callback: types.CallbackQuery):
+    """Toggle cluster digest mode"""
+    data = CallbackDataModel.parse_raw(callback.data)
+    handler = AsyncClusterHandler()
+    try:
+        cluster = await handler.toggle_digest(data.id)
+        msg, markup = KeyboardConstructor.get_cluster_detail(cluster)
+        await callback.message.edit_text(msg)
+        await callback.message.edit_reply_markup(markup)
+        await callback.answer('Success')
+    except NotExist:
+        await callback.answer('Cluster not exist')
+        callback.message.from_user = callback.from_user
+        await handle_groups(callback.message)
+    except Exception as e:
+        LOGGER.error(str(e))
 
 
 async def handle_delete_cluster(callback: types.CallbackQuery):
     """Delete cluster"""
     data = CallbackDataModel.parse_raw(callback.data)
-    handler = ClusterHandler()
+    handler = AsyncClusterHandler()
     try:
-        handler.delete_cluster(data.id)
+        await handler.delete_cluster(data.id)
     except NotExist:
         await callback.answer('')
         await callback.message.answer('Cluster not exist')
     else:
         await callback.answer('')
         await callback.message.answer('Success')
-    finally:
-        handler.session.dispose()
     callback.message.from_user = callback.from_user
     await handle_groups(callback.message)
 
@@ -5,7 +5,7 @@ from aiogram import types
 from aiogram.dispatcher import FSMContext
 
 from handlers.bot_handlers import KeyboardConstructor
-from handlers.database_handlers import UsersHandler
+from handlers.async_database_handlers import AsyncUsersHandler
 from handlers.states import AddClusterState, AddAddressState
 from logger import LOGGER
 from schema.text_messages import TextMessages
@@ -15,7 +15,7 @@ from schema.bot_schema import CallbackDataModel
 async def handle_alert_history_csv(callback: types.CallbackQuery):
     """Returns csv alert history for user"""
     data = CallbackDataModel.parse_raw(callback.data)
-    filename = KeyboardConstructor.create_alert_history_report(data.id)
+    filename = await KeyboardConstructor.create_alert_history_report(data.id)
     try:
         with open(filename, 'rb') as f:
             await callback.answer('Success', show_alert=False)
@@ -39,9 +39,9 @@ async def handle_help(message: types.Message):
 
 async def handle_profile(message: types.Message):
     """Handle users profile"""
-    handler = UsersHandler()
+    handler = AsyncUsersHandler()
     try:
-        user = handler.get_user_by_id(message.from_user.id)
+        user = await handler.get_user_by_id(message.from_user.id)
         button = types.InlineKeyboardButton(
             text='🚨Get my alert history',
             callback_data=CallbackDataModel(
@@ -57,8 +57,6 @@ async def handle_profile(message: types.Message):
             await message.answer(str(user), reply_markup=markup)
     except Exception as e:
         LOGGER.error(str(e))
-    finally:
-        handler.session.dispose()
 
 
 async def handle_group_add(message: types.Message, state: FSMContext):
@@ -72,9 +70,9 @@ async def handle_group_add(message: types.Message, state: FSMContext):
 
 async def handle_groups(message: types.Message):
     """Handle 'My clusters' command"""
-    handler = UsersHandler()
+    handler = AsyncUsersHandler()
     try:
-        user = handler.get_user_by_id(message.from_user.id)
+        user = await handler.get_user_by_id(message.from_user.id)
         if not user:
             msg = 'You are not registered yet. type "/start" to register'
             await message.answer(msg)
@@ -83,8 +81,6 @@ async def handle_groups(message: types.Message):
             await message.answer(msg or "You don't added any clusters yet")
     except Exception as e:
         LOGGER.error(str(e))
-    finally:
-        handler.session.dispose()
 
 
 async def handle_choose_cluster(callback: types.CallbackQuery, state: FSMContext):
@@ -99,18 +95,14 @@ async def handle_choose_cluster(callback: types.CallbackQuery, state: FSMContext
 
 async def handle_add_address_main(message: types.Message, state: FSMContext):
     """Handler for add address main menu command"""
-    handler = UsersHandler()
-    try:
-        user = handler.get_user_by_id(message.from_user.id)
-        if not len(user.clusters):
-            await state.update_data(cluster_id=None)
-            await state.set_state(AddAddressState.wallet)
-            msg = 'Input address'
-            buttons = KeyboardConstructor.get_cancel_button()
-        else:
-            ids = [(i.name, i.id) for i in user.clusters]
-            buttons = KeyboardConstructor.get_clusters_choices(ids)
-            msg = 'Choose cluster'
-        await message.answer(msg, reply_markup=buttons)
-    finally:
-        handler.session.dispose()
+    user = await AsyncUsersHandler().get_user_by_id(message.from_user.id)
+    if not len(user.clusters):
+        await state.update_data(cluster_id=None)
+        await state.set_state(AddAddressState.wallet)
+        msg = 'Input address'
+        buttons = KeyboardConstructor.get_cancel_button()
+    else:
+        ids = [(i.name, i.id) for i in user.clusters]
+        buttons = KeyboardConstructor.get_clusters_choices(ids)
+        msg = 'Choose cluster'
+    await message.answer(msg, reply_markup=buttons)
@@ -1,8 +1,8 @@
 """Config module"""
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from exceptions import DatabaseConfigError
 
@@ -17,6 +17,10 @@ class DatabaseConfig(BaseModel):
     host: str
     port: int
     name: str
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_pre_ping: bool = True
+    pool_recycle: int = 3600
 
     def get_src(self, sync: bool = True) -> str:
         """
@@ -35,18 +39,132 @@ class DatabaseConfig(BaseModel):
         )
 
 
+class ConsumerConfig(BaseModel):
+    """Kafka consumer tuning"""
+    batch_mode: bool = False
+    max_batch_size: int = 500
+    max_wait_ms: int = 1000
+    workers: int = 1
+    worker_queue_size: int = 100
+
+
+class ProducerConfig(BaseModel):
+    """Kafka producer tuning"""
+    linger_ms: int = 5
+    max_batch_size: int = 16384
+    compression_type: Optional[str] = None
+
+
+class RetryConfig(BaseModel):
+    """Failed notifications retry policy"""
+    max_attempts: int = 5
+    backoff_s: float = 5
+    backoff_max_s: float = 600
+
+
+class SubscriptionsConfig(BaseModel):
+    """Watched addresses index settings"""
+    refresh_s: int = 300
+
+
+class BillingConfig(BaseModel):
+    """Notifications billing settings"""
+    flush_interval_ms: int = 1000
+    flush_rows: int = 500
+
+
+class DeliveryConfig(BaseModel):
+    """Telegram messages sending limits"""
+    rate: float = 30
+    chat_rate: float = 1
+    group_per_minute: float = 20
+    max_in_flight: int = 30
+    fanout: int = 50
+    restart_delay_s: float = 5
+    drain_s: float = 10
+
+
+class DigestConfig(BaseModel):
+    """Alert digest settings"""
+    window_s: int = 10
+    max_lines: int = 5
+
+
+class RenderProfile(BaseModel):
+    """Graph image size and encoding for graphs up to max_nodes nodes"""
+    max_nodes: int
+    width: int
+    height: int
+    max_bytes: int
+    format: str = 'jpeg'
+
+
+class RenderConfig(BaseModel):
+    """Graph rendering worker processes settings"""
+    workers: int = 2
+    queue_size: int = 8
+    timeout_s: float = 30
+    debug_cache_dir: Optional[str] = None
+    debug_cache_mb: int = 100
+    reuse_figure: bool = True
+    max_staleness_s: float = 30
+    profiles: List[RenderProfile] = [
+        RenderProfile(max_nodes=12, width=1280, height=896, max_bytes=150000, format='png'),
+        RenderProfile(max_nodes=30, width=1600, height=1120, max_bytes=350000),
+        RenderProfile(max_nodes=100000, width=2048, height=1434, max_bytes=600000),
+    ]
+
+
+class GraphConfig(BaseModel):
+    """Alert graph settings"""
+    window_days: int = 30
+    max_edges: int = 1000
+    cache_mb: int = 64
+    draw_edges: int = 40
+    # The wallet, at least one counterparty and the "other" node
+    draw_nodes: int = Field(30, ge=3)
+    merge_labeled: bool = False
+    layout_wallets: int = 10000
+    layout_keep_renders: int = 20
+    layout_snapshot: Optional[str] = None
+
+
+class WebhookConfig(BaseModel):
+    """Telegram updates webhook settings. Updates are polled if url is not set"""
+    url: Optional[str] = None
+    path: str = '/webhook'
+    host: str = '0.0.0.0'
+    port: int = 8080
+    secret_token: Optional[str] = None
+
+
 class Config(BaseModel):
     """Config class. Contains all necessary settings values"""
     TOKEN: str
     databases: Dict[str, DatabaseConfig]
     kafka: str
+    api_server: Optional[str] = None
+    webhook: WebhookConfig = WebhookConfig()
+    consumer: ConsumerConfig = ConsumerConfig()
+    producer: ProducerConfig = ProducerConfig()
+    retry: RetryConfig = RetryConfig()
+    subscriptions: SubscriptionsConfig = SubscriptionsConfig()
+    billing: BillingConfig = BillingConfig()
+    delivery: DeliveryConfig = DeliveryConfig()
+    digest: DigestConfig = DigestConfig()
+    render: RenderConfig = RenderConfig()
+    graph: GraphConfig = GraphConfig()
 
-    def get_database_src(self, name: str, sync: bool = True) -> str:
-        """Returns src for specified database"""
+    def get_database(self, name: str) -> DatabaseConfig:
+        """Returns config for specified database"""
         db = self.databases.get(name)
         if not db:
             raise DatabaseConfigError(f"Database {name} config data not exist")
-        return db.get_src(sync)
+        return db
+
+    def get_database_src(self, name: str, sync: bool = True) -> str:
+        """Returns src for specified database"""
+        return self.get_database(name).get_src(sync)
 
 PATH = Path(__file__).resolve().parent
 with open(f"{PATH}/config.json", 'r', encoding='utf-8') as f:
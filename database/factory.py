@@ -1,5 +1,5 @@
 """Database connection factory"""
-
+from typing import Dict
 
 from sqlalchemy import create_engine
 from sqlalchemy.engine import Engine
@@ -10,7 +10,10 @@ from config import settings
 
 
 class DatabaseFactory:
-    """Connection factory"""
+    """Connection factory. Keeps one pooled engine per database for the whole process"""
+    __sync_engines: Dict[str, Engine] = {}
+    __async_engines: Dict[str, AsyncEngine] = {}
+
     @staticmethod
     def get_src(name: str, sync: bool = True) -> str:
         """
@@ -24,15 +27,30 @@ class DatabaseFactory:
         """
         return settings.get_database_src(name, sync)
 
+    @staticmethod
+    def get_pool_options(name: str) -> dict:
+        """Returns connection pool options for database"""
+        db = settings.get_database(name)
+        return dict(
+            pool_size=db.pool_size,
+            max_overflow=db.max_overflow,
+            pool_pre_ping=db.pool_pre_ping,
+            pool_recycle=db.pool_recycle
+        )
+
     @classmethod
     def get_async_engine(cls, name: str) -> AsyncEngine:
-        """Create and return database connection async engine"""
-        return create_async_engine(cls.get_src(name, False))
+        """Returns shared database connection async engine"""
+        if name not in cls.__async_engines:
+            cls.__async_engines[name] = create_async_engine(cls.get_src(name, False), **cls.get_pool_options(name))
+        return cls.__async_engines[name]
 
     @classmethod
     def get_sync_engine(cls, name: str) -> Engine:
-        """Create and return database connection sync engine"""
-        return create_engine(cls.get_src(name))
+        """Returns shared database connection sync engine"""
+        if name not in cls.__sync_engines:
+            cls.__sync_engines[name] = create_engine(cls.get_src(name), **cls.get_pool_options(name))
+        return cls.__sync_engines[name]
 
     @classmethod
     def get_async_session(cls, name: str) -> AsyncSession:
@@ -43,3 +61,13 @@ class DatabaseFactory:
     def get_sync_session(cls, name: str) -> Session:
         """Create and return database connection sync session"""
         return Session(bind=cls.get_sync_engine(name))
+
+    @classmethod
+    async def dispose_all(cls) -> None:
+        """Close all pooled connections. Call on shutdown"""
+        for engine in cls.__sync_engines.values():
+            engine.dispose()
+        for engine in cls.__async_engines.values():
+            await engine.dispose()
+        cls.__sync_engines = {}
+        cls.__async_engines = {}
@@ -1,6 +1,6 @@
 """Bot database models"""
 
-from sqlalchemy import Column, BOOLEAN, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, BOOLEAN, ForeignKey, UniqueConstraint, Index
 from sqlalchemy.dialects.mysql.types import VARCHAR, BIGINT, DATETIME, NUMERIC, SMALLINT, LONGTEXT, FLOAT, INTEGER
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -50,6 +50,8 @@ class Cluster(Base):
     user_id = Column(BIGINT, ForeignKey('users.id', onupdate='CASCADE', ondelete='CASCADE'))
     chats = Column(LONGTEXT)
     watch = Column(BOOLEAN(create_constraint=True), default=True)
+    # Seconds to collect alerts into one digest message, 0 sends every transaction at once
+    digest_window = Column(SMALLINT(unsigned=True), nullable=False, default=0, server_default='0')
 
     addresses = relationship(
         'ClusterAddress',
@@ -92,8 +94,8 @@ class Address(Base):
     )
     add_success = Column(BOOLEAN(create_constraint=True), default=True)
 
-    constraint = UniqueConstraint(
-        wallet, blockchain_id
+    __table_args__ = (
+        UniqueConstraint('wallet', 'blockchain_id', name='uq_addresses_wallet_blockchain'),
     )
 
     blockchain = relationship(
@@ -119,6 +121,11 @@ class ClusterAddress(Base):
     watch = Column(BOOLEAN(create_constraint=True))
     address_name = Column(VARCHAR(28), nullable=False)
 
+    __table_args__ = (
+        Index('ix_clusters_addresses_address_cluster', 'address_id', 'cluster_id'),
+        Index('ix_clusters_addresses_cluster_address', 'cluster_id', 'address_id'),
+    )
+
     cluster = relationship(
         Cluster,
         back_populates='addresses',
@@ -141,6 +148,10 @@ class AlertHistory(Base):
     balance_delta = Column(NUMERIC(precision=10, scale=2), nullable=False)
     created_at = Column(DATETIME)
 
+    __table_args__ = (
+        Index('ix_alert_history_user_id', 'user_id'),
+    )
+
     user = relationship(
         User,
         back_populates='alerts',
@@ -158,3 +169,8 @@ class Transaction(Base):
     date = Column(DATETIME)
     direction = Column(VARCHAR(100), nullable=False)
     token = Column(VARCHAR(100), nullable=False)
+
+    __table_args__ = (
+        Index('ix_transactions_wallet_1_id', 'wallet_1', 'id'),
+        Index('ix_transactions_wallet_2_id', 'wallet_2', 'id'),
+    )
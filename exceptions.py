@@ -14,3 +14,8 @@ class NotExist(Exception):
 class InvalidName(Exception):
     """Raises when name don't pass check length"""
     pass
+
+
+class RenderTimeout(Exception):
+    """Raises when graph rendering takes too long"""
+    pass
@@ -1,22 +1,51 @@
+from typing import Dict, Optional, Tuple
+
 import exchange_and_bridge_controller.everscale as ev
+from logger import LOGGER
 
 class Controller ():
+    __labels: Dict[Tuple[str, str], Optional[str]] = {}
+    __labels_limit = 100000
+
     @classmethod
     async def check_wallet (cls, wallet: str, blockhain: str) -> list:
         #run a check wallet on blockchain
         if (blockhain == 'Everscale Mainnet'):
             return await cls._check_ever(wallet)
         elif (blockhain == 'Solana'):
-            return cls._check_solana()
+            return cls._check_solana(wallet)
         elif (blockhain == 'Tron'):
-            return cls._check_tron()
+            return cls._check_tron(wallet)
         return True
 
+    @classmethod
+    async def get_label(cls, wallet: str, blockhain: str) -> Optional[str]:
+        """Returns name and type of exchange, DEX or bridge wallet. Results and failures are cached"""
+        key = (wallet, blockhain)
+        if key not in cls.__labels:
+            label = None
+            try:
+                status = await cls.check_wallet(wallet, blockhain)
+            except Exception as e:
+                LOGGER.error(f'{wallet}: {e}')
+            else:
+                if isinstance(status, list) and status[0] != 'SIMPLE_ADDRESS' and status[1]:
+                    label = f'{status[1]} ({status[0]})'
+            if len(cls.__labels) >= cls.__labels_limit:
+                cls.__labels.clear()
+            cls.__labels[key] = label
+        return cls.__labels[key]
+
+    @staticmethod
     async def _check_ever(wallet: str) -> list:
         return await ev.check(wallet)
 
-    def _check_tron(wallet: str):
-        pass
+    @staticmethod
+    def _check_tron(wallet: str) -> list:
+        # Known Tron wallets are not collected yet
+        return ["SIMPLE_ADDRESS", '']
 
-    def _check_solana(wallet: str):
-        pass
\ No newline at end of file
+    @staticmethod
+    def _check_solana(wallet: str) -> list:
+        # Known Solana wallets are not collected yet
+        return ["SIMPLE_ADDRESS", '']
\ No newline at end of file
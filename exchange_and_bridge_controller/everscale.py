@@ -1,21 +1,28 @@
-from config import settings
-from sqlalchemy import create_engine
+import asyncio
+
+from database.factory import DatabaseFactory
 import pandas as pd
+from sqlalchemy import text
 from logger import LOGGER
 
 bridge_address = '0:d19c5400e081ae772c7dd2dab07199097fc06672574ccc1015a8da8c7d4f32c5'
 
 async def check(wallet: str) -> list:
-    """Сheck if the address is a DEX or a bridge"""
-    _db_ever_str = settings.get_database_src('evermarketparse')
-    sql_eng =  create_engine(_db_ever_str)
-    db_connect = sql_eng.connect()
+    """Сheck if the address is a DEX or a bridge. Database is queried in a thread, not blocking the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, check_sync, wallet)
+
 
+def check_sync(wallet: str) -> list:
+    """Сheck if the address is a DEX or a bridge"""
+    sql_eng = DatabaseFactory.get_sync_engine('evermarketparse')
     try:
-        db_response = pd.read_sql(f"SELECT x.* FROM freeton_wallets.everscale_wallets x WHERE wallet like '{wallet}'", con=db_connect)
+        with sql_eng.connect() as db_connect:
+            db_response = pd.read_sql(
+                text("SELECT x.* FROM freeton_wallets.everscale_wallets x WHERE wallet like :wallet"),
+                con=db_connect,
+                params={'wallet': wallet}
+            )
         LOGGER.info(str(db_response.to_dict()))
-        db_connect.close()
-        sql_eng.dispose()
         if db_response.empty:
             return ["SIMPLE_ADDRESS", '']
         else:
@@ -32,7 +39,4 @@ async def check(wallet: str) -> list:
                 return ["SIMPLE_ADDRESS", '']
     except Exception as e:
         LOGGER.error(str(e))
-        db_connect.close()
-        sql_eng.dispose()
         return ["SIMPLE_ADDRESS", '']
-
@@ -1,156 +1,155 @@
 import datetime
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
 from matplotlib import patches
+from matplotlib.axes import Axes
 import networkx as nx
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 from graphs.my_view import my_draw_networkx_edge_labels
-from logger import LOGGER
 
-from handlers.database_handlers import TransactionHandler
-from database.models import Transaction
-import time
 
-from config import PATH
+# Node of collapsed counterparties
+OTHER = 'other'
+
+
+class GraphEdges(NamedTuple):
+    """Aggregated graph edges as plain arrays"""
+    src: np.ndarray
+    dst: np.ndarray
+    weight: np.ndarray
+    curved: np.ndarray
+    highlight: int
+    labels: Optional[Dict[str, str]] = None
+
 
 class Graph():
 
     def __init__(self):
         pass
 
-    def draw_graph(self, wallet, user_id ,date_user_created, date_last_transactions):
-        try:
-            #limit 200 tr -> drop old transaction
-            tr_handler = TransactionHandler()
-            transactions: list(Transaction) = tr_handler.get_transaction(wallet, date_user_created)
-            if len(transactions) > 200:
-                transactions = transactions [-200:]
-
-            tr_to_pandas = {"wallet":[], "dest":[], "sum": [], "date": [], "token":[]}
-
-            for tr in transactions:
-                if time.mktime(tr.date.timetuple()) < time.mktime(date_user_created.timetuple()) \
-                    and time.mktime(tr.date.timetuple()) > date_last_transactions:
-                        continue
-                tr_to_pandas['wallet'].append(tr.wallet_1)
-                tr_to_pandas['dest'].append(tr.wallet_2)
-                tr_to_pandas['sum'].append(tr.balance)
-                tr_to_pandas['date'].append(time.mktime(tr.date.timetuple()))
-                tr_to_pandas['token'].append(tr.token)
-
-            df = pd.DataFrame.from_dict(tr_to_pandas)
-            df = df.sort_values(by=['date'])
-            df_token = pd.DataFrame(df.filter(['token'], axis=1))
-            df  = pd.DataFrame(df.filter(['wallet','dest','sum'], axis=1))
-
-            nodes = df.values.tolist()
-            nodes_crop = []
-            for node in nodes:
-                nodes_crop.append((node[0], node[1]))
-
-            G = nx.MultiDiGraph()
-
-            for node in nodes:
-                G.add_edge(node[0], node[1], weight=node[2])
-
-            arrSt1 = patches.ArrowStyle.CurveFilledB(head_length=1,head_width=0.5 )
-
-            labels = nx.get_edge_attributes(G,'weight')
-
-            # for key in lables.keys():
-            labels_new = {} # {('addr_1',addr_2): [in, out]} where in, out - numbers
-            old_labels = list(labels.keys())
-
-            for key in old_labels:
-                if (key[0], key[1]) in labels_new:
-                    labels_new[(key[0], key[1])] = labels_new[(key[0], key[1])]+ labels[key]
-                    continue
-                else:
-                    labels_new[(key[0], key[1])] = labels[key]
-                    continue
-
-            G1 = nx.DiGraph()
-
-            for label in labels_new.keys():
-                G1.add_edge(label[0], label[1], weight=labels_new[label])
-
-            pos=nx.shell_layout(G1)
-
-
-            # for key in labels.keys(): #zip(labels.keys(), df_token.iterrows()):
-            #     labels[key] = str(labels[key]) #+' '+ str(token[1].token)
-            nodes_crop.reverse()
-            temp = []
-            for x in nodes_crop:
-                if x not in temp:
-                    temp.append(x)
-            nodes_crop = temp
-
-            nd_colors = ['green']*len(G1.nodes())
-            i = 0
-            for node in pos.keys():
-                LOGGER.info(f'{node}-{nodes_crop[0][1]}')
-                if node == nodes_crop[0][1]:
-                    nd_colors[i] = 'red'
-                    break
-                else:
-                    i += 1
-
-            edge_colors = ['green'] * len(G1.edges())
-            i = 0
-            for edge in G1.edges():
-                if edge == nodes_crop[0]:
-                    edge_colors[i] = 'red'
-                    break
-                else:
-                    i += 1
-
-            curved_edges_colors = []
-            straight_edges_colors = []
-
-            edges_for_find_color = list(G1.edges())[:]
-            curved_edges = [edge for edge in G1.edges() if reversed(edge) in G1.edges()]
-            i = 0
-            curv_index = []
-            for curved_edge in curved_edges:
-                curved_edges_colors.append(edge_colors[edges_for_find_color.index(curved_edge)])
-                curv_index.append(edges_for_find_color.index(curved_edge))
-
-            for i in range(0, len(edge_colors)):
-                if i in curv_index:
-                    continue
-                else:
-                    straight_edges_colors.append(edge_colors[i])
-
-            plt.style.use('mpl20')
-            plt.figure(figsize=(20,14), dpi=50)
-            plt.axis('off')
-
-
-            G = G1
-            #pos=nx.shell_layout(G)
-            nx.draw_networkx_nodes(G, pos, node_color=nd_colors, node_size= 500)
-            nx.draw_networkx_labels(G, pos, clip_on=False,  horizontalalignment= 'left')
-            curved_edges = [edge for edge in G.edges() if reversed(edge) in G.edges()]
-
-            if len(curved_edges) == 0:
-                straight_edges = list(G.edges())[:]
-            else:
-                straight_edges = list(set(G.edges()) - set(curved_edges))
-
-            nx.draw_networkx_edges(G, pos,edgelist=straight_edges, arrowstyle=arrSt1, edge_color=straight_edges_colors)
-            arc_rad = 0.15
-            nx.draw_networkx_edges(G, pos,edgelist=curved_edges, connectionstyle=f'arc3, rad = {arc_rad}', arrowstyle=arrSt1, edge_color=curved_edges_colors)
-
-            edge_weights = nx.get_edge_attributes(G,'weight')
-            curved_edge_labels = {edge: edge_weights[edge] for edge in curved_edges}
-            straight_edge_labels = {edge: edge_weights[edge] for edge in straight_edges}
-
-            my_draw_networkx_edge_labels(G, pos, edge_labels=curved_edge_labels, rotate=False,rad = arc_rad, font_size=20)
-            nx.draw_networkx_edge_labels(G, pos, edge_labels=straight_edge_labels, rotate=False, font_size=20)
-            now = datetime.datetime.now().strftime("%d-%m-%Y-%H-%M-%S")
-            plt.savefig(f'{PATH}/graphs/img/{user_id}-{date_last_transactions}-{now}.jpg', dpi=250, bbox_inches='tight')
-
-            return now
-        except Exception as e:
-            LOGGER.error(str(e))
-
+    @staticmethod
+    def get_edges(transactions: List[Tuple[str, str, float, datetime.datetime]],
+                  date_last_transactions: float) -> List[Tuple[str, str, float]]:
+        """
+        Returns graph edges (source, destination, sum) up to the alerted transaction
+        :param transactions: (source, destination, sum, date) ordered by date
+        :param date_last_transactions: alerted transaction timestamp
+        """
+        # Database may round the stored date up to a second
+        until = datetime.datetime.utcfromtimestamp(math.ceil(date_last_transactions))
+        return [(src, dst, value) for src, dst, value, date in transactions if date <= until]
+
+    @staticmethod
+    def group(df: pd.DataFrame, highlight: Tuple[str, str], labels: Optional[Dict[str, str]] = None) -> GraphEdges:
+        """
+        Merge parallel edges and find edges having a reverse one
+        :param df: edges with src, dst and sum columns
+        :param highlight: (source, destination) of highlighted edge
+        :param labels: nodes display names
+        :return: GraphEdges
+        """
+        grouped = df.groupby(['src', 'dst'], sort=False, as_index=False)['sum'].sum()
+        src = grouped['src'].to_numpy()
+        dst = grouped['dst'].to_numpy()
+        pairs = pd.MultiIndex.from_arrays([src, dst])
+        curved = pd.MultiIndex.from_arrays([dst, src]).isin(pairs)
+        index = int(np.flatnonzero((src == highlight[0]) & (dst == highlight[1]))[0])
+        return GraphEdges(src, dst, grouped['sum'].to_numpy(), curved, index, labels)
+
+    @classmethod
+    def aggregate(cls, edges: List[Tuple[str, str, float]]) -> GraphEdges:
+        """
+        Merge parallel edges and find edges having a reverse one
+        :param edges: (source, destination, sum) ordered by date, the last one is highlighted
+        :return: GraphEdges
+        """
+        df = pd.DataFrame(edges, columns=['src', 'dst', 'sum'])
+        return cls.group(df, (df['src'].iat[-1], df['dst'].iat[-1]))
+
+    @classmethod
+    def simplify(cls, edges: GraphEdges, max_edges: int, max_nodes: int,
+                 labels: Optional[Dict[str, str]] = None) -> GraphEdges:
+        """
+        Limit graph size. Counterparties with the same label are merged into one node,
+        the largest edges are kept and the rest counterparties are collapsed into the "other" node
+        :param edges: aggregated graph edges
+        :param max_edges: max number of edges
+        :param max_nodes: max number of nodes
+        :param labels: {wallet: label} of known counterparties
+        :return: GraphEdges
+        """
+        df = pd.DataFrame({'src': edges.src, 'dst': edges.dst, 'sum': edges.weight})
+        highlight = (edges.src[edges.highlight], edges.dst[edges.highlight])
+        if labels:
+            df['src'] = df['src'].map(labels).fillna(df['src'])
+            df['dst'] = df['dst'].map(labels).fillna(df['dst'])
+            highlight = (labels.get(highlight[0], highlight[0]), labels.get(highlight[1], highlight[1]))
+            df = df.groupby(['src', 'dst'], sort=False, as_index=False)['sum'].sum()
+        if len(df) <= max_edges and len(pd.unique(df[['src', 'dst']].values.ravel())) <= max_nodes:
+            return cls.group(df, highlight)
+
+        # The highlighted edge goes first, then edges by value
+        is_highlight = (df['src'] == highlight[0]) & (df['dst'] == highlight[1])
+        order = np.lexsort((-df['sum'].abs().to_numpy(), ~is_highlight.to_numpy()))
+        kept, kept_nodes = [], set()
+        for i in order:
+            if len(kept) >= max(max_edges * 3 // 4, 1):
+                break
+            new_nodes = {df['src'].iat[i], df['dst'].iat[i]} - kept_nodes
+            if len(kept_nodes) + len(new_nodes) > max_nodes - 1:
+                continue
+            kept.append(i)
+            kept_nodes |= new_nodes
+
+        rest = df.drop(df.index[kept])
+        src_kept = rest['src'].isin(kept_nodes)
+        dst_kept = rest['dst'].isin(kept_nodes)
+        collapsed = pd.unique(np.concatenate([rest['src'][~src_kept], rest['dst'][~dst_kept]]))
+        # Edges between kept nodes and the other node, edges inside the other node are not drawn
+        rest = rest.assign(src=rest['src'].where(src_kept, OTHER), dst=rest['dst'].where(dst_kept, OTHER))
+        rest = rest[src_kept ^ dst_kept]
+        rest = rest.groupby(['src', 'dst'], sort=False, as_index=False)['sum'].sum()
+        rest = rest.iloc[np.argsort(-rest['sum'].abs().to_numpy(), kind='stable')[:max_edges - len(kept)]]
+        df = pd.concat([df.iloc[kept], rest], ignore_index=True)
+        return cls.group(df, highlight, {OTHER: f'{OTHER} ({len(collapsed)})'} if len(collapsed) else None)
+
+    def draw(self, edges: GraphEdges, positions: Optional[Dict[str, Tuple[float, float]]], ax: Axes):
+        """
+        Draw aggregated edges
+        :param edges: aggregated graph edges
+        :param positions: nodes positions, shell layout is used if not specified
+        :param ax: axes to draw on
+        """
+        G = nx.DiGraph()
+        G.add_weighted_edges_from(zip(edges.src, edges.dst, edges.weight))
+        pos = positions or nx.shell_layout(G)
+
+        arrSt1 = patches.ArrowStyle.CurveFilledB(head_length=1,head_width=0.5 )
+
+        nd_colors = np.where(np.array(G.nodes(), dtype=object) == edges.dst[edges.highlight], 'red', 'green')
+        edge_colors = np.full(len(edges.src), 'green', dtype=object)
+        edge_colors[edges.highlight] = 'red'
+        pairs = list(zip(edges.src, edges.dst))
+        curved_edges = [pair for pair, curved in zip(pairs, edges.curved) if curved]
+        straight_edges = [pair for pair, curved in zip(pairs, edges.curved) if not curved]
+
+        nx.draw_networkx_nodes(G, pos, node_color=list(nd_colors), node_size= 500, ax=ax)
+        labels = edges.labels or {}
+        nx.draw_networkx_labels(G, pos, labels={node: labels.get(node, node) for node in G},
+                                clip_on=False,  horizontalalignment= 'left', ax=ax)
+
+        nx.draw_networkx_edges(G, pos,edgelist=straight_edges, arrowstyle=arrSt1,
+                               edge_color=list(edge_colors[~edges.curved]), ax=ax)
+        arc_rad = 0.15
+        nx.draw_networkx_edges(G, pos,edgelist=curved_edges, connectionstyle=f'arc3, rad = {arc_rad}', arrowstyle=arrSt1,
+                               edge_color=list(edge_colors[edges.curved]), ax=ax)
+
+        weights = dict(zip(pairs, edges.weight))
+        curved_edge_labels = {edge: weights[edge] for edge in curved_edges}
+        straight_edge_labels = {edge: weights[edge] for edge in straight_edges}
+
+        my_draw_networkx_edge_labels(G, pos, edge_labels=curved_edge_labels, rotate=False,rad = arc_rad, font_size=20,
+                                     ax=ax)
+        nx.draw_networkx_edge_labels(G, pos, edge_labels=straight_edge_labels, rotate=False, font_size=20, ax=ax)
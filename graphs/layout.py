@@ -0,0 +1,122 @@
+"""Stable graph layouts"""
+import heapq
+import json
+import math
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Tuple
+
+from config import settings
+from logger import LOGGER
+
+Position = Tuple[float, float]
+
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+
+class WalletLayout:
+    """Spiral places of one wallet graph. Nodes not drawn in the last renders free their places"""
+
+    def __init__(self, renders: int = 0, nodes: Dict[str, List[int]] = None):
+        self.renders = renders
+        # {node: [place, last render the node was drawn in]}
+        self.nodes: Dict[str, List[int]] = nodes or {}
+        used = {place for place, _ in self.nodes.values()}
+        self.next_place = max(used, default=-1) + 1
+        self.free: List[int] = [place for place in range(self.next_place) if place not in used]
+        heapq.heapify(self.free)
+
+    def place(self, nodes: Iterable[str]) -> Dict[str, int]:
+        """
+        Returns spiral places of drawn nodes, new nodes take the lowest free place
+        :param nodes: drawn nodes
+        :return: {node: place}
+        """
+        self.renders += 1
+        result = {}
+        for node in nodes:
+            item = self.nodes.get(node)
+            if item is None:
+                if self.free:
+                    place = heapq.heappop(self.free)
+                else:
+                    place = self.next_place
+                    self.next_place += 1
+                item = self.nodes[node] = [place, self.renders]
+            item[1] = self.renders
+            result[node] = item[0]
+        self.expire(self.renders - settings.graph.layout_keep_renders)
+        return result
+
+    def expire(self, render: int) -> None:
+        """Forget nodes last drawn before render, the center place is never freed"""
+        for node, (place, drawn) in list(self.nodes.items()):
+            if drawn <= render and place != 0:
+                del self.nodes[node]
+                heapq.heappush(self.free, place)
+
+
+class LayoutCache:
+    """
+    Node positions of recently rendered wallets. Nodes keep their positions between renders,
+    new nodes take the lowest free place of a spiral around the wallet
+    """
+    __wallets: 'OrderedDict[str, WalletLayout]' = OrderedDict()
+
+    @staticmethod
+    def get_place(index: int) -> Position:
+        """Returns position of spiral place, the first place is the center"""
+        radius = math.sqrt(index)
+        return radius * math.cos(index * GOLDEN_ANGLE), radius * math.sin(index * GOLDEN_ANGLE)
+
+    @classmethod
+    def get_positions(cls, wallet: str, nodes: Iterable[str]) -> Dict[str, Position]:
+        """
+        Returns positions of graph nodes, places nodes seen for the first time.
+        Nodes not drawn in the last `layout_keep_renders` renders of the wallet are forgotten
+        :param wallet: alerted wallet
+        :param nodes: graph nodes
+        :return: {node: (x, y)}
+        """
+        layout = cls.__wallets.get(wallet)
+        if layout is None:
+            layout = WalletLayout(nodes={wallet: [0, 0]})
+            cls.__wallets[wallet] = layout
+            while len(cls.__wallets) > settings.graph.layout_wallets:
+                cls.__wallets.popitem(last=False)
+        else:
+            cls.__wallets.move_to_end(wallet)
+        return {node: cls.get_place(place) for node, place in layout.place(nodes).items()}
+
+    @classmethod
+    def load(cls) -> None:
+        """Read layouts snapshot"""
+        path = settings.graph.layout_snapshot
+        if not path:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                wallets = json.load(f)
+            cls.__wallets = OrderedDict(
+                (wallet, WalletLayout(layout['renders'], layout['nodes']))
+                for wallet, layout in wallets.items()
+            )
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            LOGGER.error(f'Layouts snapshot {path}: {e}')
+            return
+
+    @classmethod
+    def save(cls) -> None:
+        """Write layouts snapshot"""
+        path = settings.graph.layout_snapshot
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    wallet: {'renders': layout.renders, 'nodes': layout.nodes}
+                    for wallet, layout in cls.__wallets.items()
+                }, f)
+        except OSError as e:
+            LOGGER.error(f'Layouts snapshot {path}: {e}')
@@ -98,7 +98,6 @@ def my_draw_networkx_edge_labels(
         labels = {(u, v): d for u, v, d in G.edges(data=True)}
     else:
         labels = edge_labels
-    print(labels)
     text_items = {}
     for (n1, n2), label in labels.items():
         (x1, y1) = pos[n1]
@@ -117,7 +116,6 @@ def my_draw_networkx_edge_labels(
         ctrl_mid_2 = 0.5*pos_2 + 0.5*ctrl_1
         bezier_mid = 0.5*ctrl_mid_1 + 0.5*ctrl_mid_2
         (x, y) = ax.transData.inverted().transform(bezier_mid)
-        print(x, y)
         if rotate:
             # in degrees
             angle = np.arctan2(y2 - y1, x2 - x1) / (2.0 * np.pi) * 360
@@ -0,0 +1,295 @@
+"""Graph rendering in worker processes"""
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from matplotlib import style
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+from config import settings, RenderProfile
+from exceptions import RenderTimeout
+from graphs.graph import Graph, GraphEdges
+from graphs.layout import Position
+from logger import LOGGER
+from schema.kafka_schema import Transaction
+
+PNG_SIGNATURE = b'\x89PNG'
+
+
+def init_worker() -> None:
+    """Import plotting libraries once per worker process"""
+    import matplotlib.backends.backend_agg
+    import networkx
+    import graphs.graph
+
+
+def warm_up() -> None:
+    """Job that makes pool start a worker"""
+    pass
+
+
+# Figure reused by the worker process renders
+worker_figure: Optional[Figure] = None
+
+
+def get_figure() -> Figure:
+    """Returns empty figure with Agg canvas"""
+    global worker_figure
+    if settings.render.reuse_figure and worker_figure is not None:
+        return worker_figure
+    figure = Figure(figsize=(20, 14), dpi=50)
+    FigureCanvasAgg(figure)
+    if settings.render.reuse_figure:
+        worker_figure = figure
+    return figure
+
+
+def get_profile(edges: GraphEdges) -> RenderProfile:
+    """Returns the first profile allowing graph nodes count, the last profile for larger graphs"""
+    nodes = len(set(edges.src) | set(edges.dst))
+    profiles = sorted(settings.render.profiles, key=lambda x: x.max_nodes)
+    for profile in profiles:
+        if nodes <= profile.max_nodes:
+            return profile
+    return profiles[-1]
+
+
+def get_extension(image: bytes) -> str:
+    """Returns image file extension"""
+    return 'png' if image.startswith(PNG_SIGNATURE) else 'jpg'
+
+
+def rasterize(figure: Figure, profile: RenderProfile) -> Image.Image:
+    """Draw figure cropped to its content, not larger than profile dimensions"""
+    width, height = figure.get_size_inches()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', dpi=min(profile.width / width, profile.height / height),
+                   bbox_inches='tight', pil_kwargs={'compress_level': 0})
+    buffer.seek(0)
+    return Image.open(buffer).convert('RGB')
+
+
+def encode_image(image: Image.Image, profile: RenderProfile) -> bytes:
+    """
+    Encode image to fit profile size budget.
+    PNG uses a palette with fewer colors until it fits, JPEG lowers quality and then image size
+    """
+    if profile.format == 'png':
+        for colors in (64, 32, 16):
+            buffer = io.BytesIO()
+            image.quantize(colors=colors, method=Image.Quantize.FASTOCTREE).save(buffer, format='PNG', optimize=True)
+            if buffer.tell() <= profile.max_bytes:
+                return buffer.getvalue()
+    while True:
+        for quality in (85, 75, 65, 55, 45):
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=quality, optimize=True)
+            if buffer.tell() <= profile.max_bytes:
+                return buffer.getvalue()
+        if min(image.size) < 256:
+            return buffer.getvalue()
+        image = image.resize((image.width * 4 // 5, image.height * 4 // 5), Image.Resampling.LANCZOS)
+
+
+def render_graph(edges: GraphEdges, positions: Dict[str, Position], profile: Optional[RenderProfile] = None) -> bytes:
+    """
+    Render graph of edges to PNG or JPEG
+    :param edges: aggregated graph edges
+    :param positions: nodes positions
+    :param profile: image size and format, chosen by nodes count if not specified
+    :return: image bytes
+    """
+    profile = profile or get_profile(edges)
+    figure = get_figure()
+    try:
+        with style.context('mpl20'):
+            ax = figure.add_subplot()
+            ax.axis('off')
+            Graph().draw(edges, positions, ax)
+        image = rasterize(figure, profile)
+    finally:
+        # Drop axes with all artists, figure is not referenced by pyplot and is freed with them
+        figure.clear()
+    return encode_image(image, profile)
+
+
+class RenderService:
+    """
+    Process pool for graph rendering. Number of waiting jobs is bounded, every job has a timeout.
+    At most one job per worker is submitted to the pool, so waiting in the queue does not count to the timeout
+    """
+    __executor: Optional[ProcessPoolExecutor] = None
+    __slots: Optional[asyncio.Semaphore] = None
+    __running: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def start(cls) -> None:
+        """Create process pool and start its workers"""
+        if cls.__executor is not None:
+            return
+        cls.__executor = ProcessPoolExecutor(max_workers=settings.render.workers, initializer=init_worker)
+        for _ in range(settings.render.workers):
+            cls.__executor.submit(warm_up)
+        if cls.__slots is None:
+            cls.__slots = asyncio.Semaphore(settings.render.workers + settings.render.queue_size)
+            cls.__running = asyncio.Semaphore(settings.render.workers)
+
+    @classmethod
+    def stop(cls) -> None:
+        """Stop workers, running jobs are killed"""
+        if cls.__executor is None:
+            return
+        executor, cls.__executor = cls.__executor, None
+        # Hung worker would block shutdown forever
+        for process in list(getattr(executor, '_processes', {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    @classmethod
+    def restart(cls) -> None:
+        """Replace process pool. Jobs of the old pool fail with BrokenProcessPool"""
+        cls.stop()
+        cls.start()
+
+    @classmethod
+    async def render(cls, edges: GraphEdges, positions: Dict[str, Position]) -> bytes:
+        """
+        Render graph in worker process. Waits while the queue is full.
+        Jobs lost when the pool is restarted after another job timeout are submitted again once
+        :param edges: aggregated graph edges
+        :param positions: nodes positions
+        :return: PNG or JPEG bytes
+        """
+        if cls.__executor is None:
+            cls.start()
+        async with cls.__slots, cls.__running:
+            for attempt in range(2):
+                executor = cls.__executor
+                future = asyncio.get_running_loop().run_in_executor(executor, render_graph, edges, positions)
+                try:
+                    return await asyncio.wait_for(future, settings.render.timeout_s)
+                except asyncio.TimeoutError:
+                    LOGGER.error(f'Graph of {len(edges.src)} edges was not rendered in {settings.render.timeout_s}s')
+                    cls.restart()
+                    raise RenderTimeout(f'Graph rendering timeout {settings.render.timeout_s}s')
+                except BrokenProcessPool:
+                    if executor is not cls.__executor and cls.__executor is not None and not attempt:
+                        # Pool was restarted because of another job timeout, run the job again in the new pool
+                        continue
+                    if cls.__executor is not None and getattr(cls.__executor, '_broken', False):
+                        cls.restart()
+                    raise
+
+
+class PendingRender:
+    """Wallet graph render waiting for the previous render of the wallet"""
+
+    def __init__(self, transaction: Transaction):
+        self.transaction = transaction
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class RenderCoalescer:
+    """
+    Graphs of the same wallet are rendered one by one. Requests made while a wallet render is waiting
+    are merged into it if their transactions are at most render.max_staleness_s apart,
+    the graph is rendered up to the newest of them and its image is returned to all requests
+    """
+    __pending: Dict[str, PendingRender] = {}
+    __last: Dict[str, asyncio.Future] = {}
+    __tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    async def render(cls, wallet: str, transaction: Transaction,
+                     render: Callable[[Transaction], Awaitable[bytes]]) -> bytes:
+        """
+        Returns wallet graph image up to the transaction or a newer one
+        :param wallet: alerted wallet
+        :param transaction: alerted transaction
+        :param render: renders wallet graph up to the transaction
+        :return: PNG or JPEG bytes
+        """
+        pending = cls.__pending.get(wallet)
+        if pending is None or \
+                abs(transaction.created_at - pending.transaction.created_at) > settings.render.max_staleness_s:
+            pending = cls.__pending[wallet] = PendingRender(transaction)
+            task = asyncio.create_task(cls.run(wallet, pending, cls.__last.get(wallet), render))
+            cls.__last[wallet] = pending.future
+            cls.__tasks.add(task)
+            task.add_done_callback(cls.__tasks.discard)
+        elif transaction.created_at > pending.transaction.created_at:
+            pending.transaction = transaction
+        return await asyncio.shield(pending.future)
+
+    @classmethod
+    async def run(cls, wallet: str, pending: PendingRender, previous: Optional[asyncio.Future],
+                  render: Callable[[Transaction], Awaitable[bytes]]) -> None:
+        """Render after the previous render of the wallet"""
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            if cls.__pending.get(wallet) is pending:
+                del cls.__pending[wallet]
+            pending.future.set_result(await render(pending.transaction))
+        except asyncio.CancelledError:
+            pending.future.cancel()
+            raise
+        except Exception as e:
+            pending.future.set_exception(e)
+        finally:
+            if cls.__pending.get(wallet) is pending:
+                del cls.__pending[wallet]
+            if cls.__last.get(wallet) is pending.future:
+                del cls.__last[wallet]
+
+
+class DebugImageCache:
+    """Optional on-disk copy of rendered graphs. Directory size is limited, least recently used images are removed"""
+    __files: Dict[str, int] = {}
+    __size = 0
+    __loaded = False
+
+    @classmethod
+    def load(cls, directory: str) -> None:
+        """Read existing images ordered by access time"""
+        os.makedirs(directory, exist_ok=True)
+        entries = sorted(os.scandir(directory), key=lambda x: x.stat().st_mtime)
+        cls.__files = {x.name: x.stat().st_size for x in entries if x.is_file()}
+        cls.__size = sum(cls.__files.values())
+        cls.__loaded = True
+
+    @classmethod
+    def put(cls, name: str, image: bytes) -> None:
+        """
+        Save image if cache is enabled
+        :param name: file name without extension
+        :param image: PNG or JPEG bytes
+        """
+        directory = settings.render.debug_cache_dir
+        if not directory:
+            return
+        try:
+            if not cls.__loaded:
+                cls.load(directory)
+            filename = f'{name}.{get_extension(image)}'
+            path = os.path.join(directory, filename)
+            if filename in cls.__files:
+                # Move to the end of eviction order
+                cls.__files[filename] = cls.__files.pop(filename)
+                os.utime(path)
+                return
+            with open(path, 'wb') as f:
+                f.write(image)
+            cls.__files[filename] = len(image)
+            cls.__size += len(image)
+            while cls.__size > settings.render.debug_cache_mb * 1024 * 1024 and len(cls.__files) > 1:
+                oldest = next(iter(cls.__files))
+                cls.__size -= cls.__files.pop(oldest)
+                os.remove(os.path.join(directory, oldest))
+        except OSError as e:
+            LOGGER.error(f'Debug image cache: {e}')
@@ -0,0 +1,688 @@
+"""Async database handlers"""
+import asyncio
+import datetime
+import json
+import time
+from decimal import Decimal
+from typing import Awaitable, Callable, Optional, List, Tuple, Dict, Set
+
+import pytz
+from sqlalchemy import and_, select, update, func, insert, union, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, aliased
+
+from config import settings
+from database.factory import DatabaseFactory
+from database.models import User, Cluster, Address, Blockchain, ClusterAddress, AlertHistory, Transaction
+from exceptions import NotExist
+from handlers.database_handlers import DatabaseHandler
+from logger import LOGGER
+from schema.alert_schema import AlertRecipient, AlertUser, Subscription
+
+
+class AsyncDatabaseHandler:
+    """Async database handler base class"""
+    check_name = staticmethod(DatabaseHandler.check_name)
+
+    def __init__(self, name: str):
+        # Shared pooled engine, must not be disposed by handlers
+        self.engine = DatabaseFactory.get_async_engine(name)
+
+    def get_session(self) -> AsyncSession:
+        """Returns new session. Loaded objects stay usable after commit"""
+        return AsyncSession(self.engine, expire_on_commit=False)
+
+
+class SubscriptionIndex:
+    """
+    In-memory index of watched addresses keyed by (blockchain_id, wallet).
+    Mutators invalidate keys, stale keys are reloaded on the next lookup.
+    Every invalidation gets a version, a load clears only invalidations made before it started
+    """
+    __subscriptions: Dict[Tuple[int, str], Subscription] = {}
+    __users: Dict[int, AlertUser] = {}
+    __stale: Dict[Tuple[int, str], int] = {}
+    __version = 0
+    __loaded_at: Optional[float] = None
+    __refresh: Optional[asyncio.Task] = None
+
+    @classmethod
+    def is_expired(cls) -> bool:
+        """Returns True if index was never loaded or must be refreshed"""
+        return cls.__loaded_at is None or time.monotonic() - cls.__loaded_at > settings.subscriptions.refresh_s
+
+    @classmethod
+    def is_loaded(cls) -> bool:
+        """Returns True if index was loaded at least once"""
+        return cls.__loaded_at is not None
+
+    @classmethod
+    def refresh(cls, load: Callable[[], Awaitable[None]]) -> asyncio.Task:
+        """Start reloading index in background. Only one reload runs at a time, the running one is returned"""
+        if cls.__refresh is None or cls.__refresh.done():
+            cls.__refresh = asyncio.create_task(load())
+            cls.__refresh.add_done_callback(cls.log_refresh)
+        return cls.__refresh
+
+    @staticmethod
+    def log_refresh(task: asyncio.Task) -> None:
+        """Log failed background reload, index is reloaded again on the next lookup"""
+        if not task.cancelled() and task.exception():
+            LOGGER.error(f'Subscriptions refresh failed: {task.exception()}')
+
+    @classmethod
+    def is_stale(cls, key: Tuple[int, str]) -> bool:
+        """Returns True if key was invalidated"""
+        return key in cls.__stale
+
+    @classmethod
+    def get(cls, key: Tuple[int, str]) -> Optional[Subscription]:
+        """Returns subscription by key"""
+        return cls.__subscriptions.get(key)
+
+    @classmethod
+    def get_user(cls, user: AlertUser) -> AlertUser:
+        """Returns shared user state updated from loaded user"""
+        shared = cls.__users.get(user.id)
+        if not shared:
+            shared = cls.__users[user.id] = user
+        elif shared is not user:
+            for field, value in user:
+                setattr(shared, field, value)
+        return shared
+
+    @classmethod
+    def get_version(cls) -> int:
+        """Returns version of the last invalidation, must be taken before reading database"""
+        return cls.__version
+
+    @classmethod
+    def set_all(cls, subscriptions: List[Subscription], version: int) -> None:
+        """
+        Replace index content
+        :param subscriptions: all subscriptions
+        :param version: index version when loading started
+        """
+        cls.__users = {}
+        cls.__stale = {k: v for k, v in cls.__stale.items() if v > version}
+        cls.__subscriptions = {}
+        for subscription in subscriptions:
+            cls.put(subscription.blockchain_id, subscription.wallet, subscription, version)
+        cls.__loaded_at = time.monotonic()
+
+    @classmethod
+    def put(cls, blockchain_id: int, wallet: str, subscription: Optional[Subscription], version: int) -> None:
+        """
+        Set or remove subscription for key
+        :param blockchain_id: blockchain id
+        :param wallet: wallet address
+        :param subscription: loaded subscription, None if address not exist
+        :param version: index version when loading started, key stays stale if invalidated later
+        """
+        key = (blockchain_id, wallet)
+        if cls.__stale.get(key, version) <= version:
+            cls.__stale.pop(key, None)
+        if subscription is None:
+            cls.__subscriptions.pop(key, None)
+            return
+        for recipient in subscription.recipients:
+            recipient.user = cls.get_user(recipient.user)
+        cls.__subscriptions[key] = subscription
+
+    @classmethod
+    def invalidate(cls, blockchain_id: int, wallet: str) -> None:
+        """Mark address as stale"""
+        cls.__version += 1
+        cls.__stale[(blockchain_id, wallet)] = cls.__version
+
+    @classmethod
+    def invalidate_cluster(cls, cluster_id: int) -> None:
+        """Mark every address watched by cluster as stale"""
+        cls.__version += 1
+        for key, subscription in cls.__subscriptions.items():
+            if any(x.cluster_id == cluster_id for x in subscription.recipients):
+                cls.__stale[key] = cls.__version
+
+    @classmethod
+    def set_notifications_remain(cls, user_id: int, value: int) -> None:
+        """Update user notifications quota"""
+        user = cls.__users.get(user_id)
+        if user:
+            user.notifications_remain = value
+
+
+class AsyncUsersHandler(AsyncDatabaseHandler):
+    """Users database handler"""
+    __db_name = 'tracer'
+
+    def __init__(self):
+        super(AsyncUsersHandler, self).__init__(self.__db_name)
+
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
+        """Get bot user by user id with clusters and their addresses"""
+        async with self.get_session() as session:
+            result = await session.execute(
+                select(User).filter(User.id == user_id).options(
+                    selectinload(User.clusters).selectinload(Cluster.addresses).selectinload(ClusterAddress.address)
+                )
+            )
+            return result.scalars().one_or_none()
+
+    async def add_user(self, user_id: int) -> User:
+        """Save new user"""
+        user = User(
+            id=user_id,
+            created_at=datetime.datetime.now(tz=pytz.UTC),
+            balance=1000,
+            notification_cost=1,
+            notifications_remain=1000,
+            is_active=True
+        )
+        async with self.get_session() as session:
+            session.add(user)
+            await session.commit()
+        return user
+
+    async def apply_charges(self, alerts: List[dict], charges: Dict[int, Tuple[int, Decimal]]) -> Dict[int, int]:
+        """
+        Save alert history rows and reduce users balances in one transaction
+        :param alerts: alert_history rows
+        :param charges: {user_id: (notifications count, amount)}
+        :return: {user_id: notifications remain} after charge
+        """
+        async with self.get_session() as session:
+            await session.execute(insert(AlertHistory), alerts)
+            for user_id, (count, amount) in charges.items():
+                await session.execute(
+                    update(User).where(User.id == user_id).values(
+                        # Column is unsigned, quota is never reduced below zero
+                        notifications_remain=case(
+                            (User.notifications_remain > count, User.notifications_remain - count), else_=0
+                        ),
+                        balance=User.balance - amount
+                    )
+                )
+            result = await session.execute(
+                select(User.id, User.notifications_remain).filter(User.id.in_(list(charges)))
+            )
+            remains = {user_id: remain for user_id, remain in result}
+            await session.commit()
+        return remains
+
+    @staticmethod
+    def get_alert_history_query(user_id: int):
+        """Returns query for user alerts"""
+        return select(AlertHistory).filter(AlertHistory.user_id == user_id)
+
+    async def get_alert_history(self, user_id: int) -> List[AlertHistory]:
+        """Returns list of alerts"""
+        async with self.get_session() as session:
+            result = await session.execute(self.get_alert_history_query(user_id))
+            return result.scalars().all()
+
+
+class AsyncClusterHandler(AsyncDatabaseHandler):
+    """Clusters database handlers"""
+    __db_name = 'tracer'
+
+    def __init__(self):
+        super(AsyncClusterHandler, self).__init__(self.__db_name)
+
+    @staticmethod
+    def get_cluster_query(cluster_id: int):
+        """Returns query for cluster with addresses"""
+        return select(Cluster).filter(Cluster.id == cluster_id).options(
+            selectinload(Cluster.addresses).selectinload(ClusterAddress.address)
+        )
+
+    async def add_cluster(self, user_id: int, name: str) -> int:
+        """Add new cluster"""
+        self.check_name(name)
+        cluster = Cluster(
+            name=name,
+            user_id=user_id,
+            chats=json.dumps([user_id])
+        )
+        async with self.get_session() as session:
+            session.add(cluster)
+            await session.commit()
+        return cluster.id
+
+    async def get_cluster_by_id(self, cluster_id: int) -> Optional[Cluster]:
+        """Get cluster by id"""
+        async with self.get_session() as session:
+            result = await session.execute(self.get_cluster_query(cluster_id))
+            return result.scalars().one_or_none()
+
+    async def rename_cluster(self, cluster_id: int, name: str) -> None:
+        """Rename cluster"""
+        self.check_name(name)
+        async with self.get_session() as session:
+            cluster: Cluster = await session.get(Cluster, cluster_id)
+            if not cluster:
+                raise NotExist(f'Cluster not exist')
+            cluster.name = name
+            await session.commit()
+        SubscriptionIndex.invalidate_cluster(cluster_id)
+
+    async def toggle_mute(self, cluster_id: int) -> Cluster:
+        """Toggle watch property for cluster by id"""
+        async with self.get_session() as session:
+            result = await session.execute(self.get_cluster_query(cluster_id))
+            cluster: Cluster = result.scalars().one_or_none()
+            if not cluster:
+                raise NotExist(f'Cluster not exist')
+            cluster.watch = not cluster.watch
+            await session.commit()
+        SubscriptionIndex.invalidate_cluster(cluster_id)
+        return cluster
+
+    async def toggle_digest(self, cluster_id: int) -> Cluster:
+        """Turn digest mode of cluster on with the default window or off"""
+        async with self.get_session() as session:
+            result = await session.execute(self.get_cluster_query(cluster_id))
+            cluster: Cluster = result.scalars().one_or_none()
+            if not cluster:
+                raise NotExist(f'Cluster not exist')
+            cluster.digest_window = 0 if cluster.digest_window else settings.digest.window_s
+            await session.commit()
+        SubscriptionIndex.invalidate_cluster(cluster_id)
+        return cluster
+
+    async def delete_cluster(self, cluster_id: int) -> None:
+        """Delete cluster"""
+        async with self.get_session() as session:
+            result = await session.execute(
+                select(Cluster).filter(Cluster.id == cluster_id).options(selectinload(Cluster.addresses))
+            )
+            cluster: Cluster = result.scalars().one_or_none()
+            if not cluster:
+                raise NotExist(f'Cluster not exist')
+            for link in cluster.addresses:
+                await session.delete(link)
+            await session.delete(cluster)
+            await session.commit()
+        SubscriptionIndex.invalidate_cluster(cluster_id)
+
+
+class AsyncAddressesHandler(AsyncDatabaseHandler):
+    """Addresses database handler"""
+
+    __db_name = 'tracer'
+
+    def __init__(self):
+        super(AsyncAddressesHandler, self).__init__(self.__db_name)
+
+    async def add_success(self, address: Subscription, cluster_id: int, state: bool) -> Tuple[str, List[str]]:
+        """Set success add value"""
+        async with self.get_session() as session:
+            await session.execute(update(Address).where(Address.id == address.address_id).values(add_success=state))
+            await session.commit()
+            cluster = await session.get(Cluster, cluster_id)
+            chats = json.loads(cluster.chats)
+        SubscriptionIndex.invalidate(address.blockchain_id, address.wallet)
+        return cluster.name, chats
+
+    async def get_blockchains(self) -> List[Blockchain]:
+        """Get list of exist blockchains"""
+        async with self.get_session() as session:
+            result = await session.execute(select(Blockchain))
+            return result.scalars().all()
+
+    async def get_blockchain_by_id(self, blockchain_id: int) -> Optional[Blockchain]:
+        """Get blockchain by id"""
+        async with self.get_session() as session:
+            return await session.get(Blockchain, blockchain_id)
+
+    async def get_address_by_id(self, address_id: int) -> ClusterAddress:
+        """Get address link by id with address, blockchain and cluster"""
+        async with self.get_session() as session:
+            result = await session.execute(
+                select(ClusterAddress).join(Cluster).options(
+                    selectinload(ClusterAddress.address).selectinload(Address.blockchain),
+                    selectinload(ClusterAddress.cluster)
+                ).filter(ClusterAddress.id == address_id)
+            )
+            link: ClusterAddress = result.scalars().one_or_none()
+            if not link:
+                raise NotExist('Address not exist')
+            return link
+
+    async def rename_address(self, address_id: int, name: str) -> Optional[int]:
+        """Rename address"""
+        self.check_name(name)
+        async with self.get_session() as session:
+            link: ClusterAddress = await session.get(ClusterAddress, address_id)
+            if not link:
+                return -1
+            link.address_name = name
+            await session.commit()
+        SubscriptionIndex.invalidate_cluster(link.cluster_id)
+
+    @staticmethod
+    async def find_address(session: AsyncSession, wallet: str, blockchain: int) -> Optional[Address]:
+        """Get address by wallet and blockchain within session"""
+        result = await session.execute(
+            select(Address).options(selectinload(Address.blockchain)).filter(
+                and_(
+                    Address.wallet == wallet,
+                    Address.blockchain_id == blockchain
+                )
+            )
+        )
+        return result.scalars().one_or_none()
+
+    async def get_address_by_wallet_and_blockchain(self, wallet: str, blockchain: int) -> Address:
+        """Get address by wallet and blockchain"""
+        async with self.get_session() as session:
+            address = await self.find_address(session, wallet, blockchain)
+            if not address:
+                raise NotExist('Address not exist')
+            return address
+
+    async def add_address(
+            self, cluster_id: int, wallet: str, blockchain: int, name: str = None, auto: bool = False
+    ) -> None:
+        """Add new address"""
+        if name:
+            self.check_name(name)
+        async with self.get_session() as session:
+            cluster = await session.get(Cluster, cluster_id)
+            if not cluster:
+                raise NotExist('Cluster not exist')
+            address = await self.find_address(session, wallet, blockchain)
+            if not address:
+                blockchain_obj = await session.get(Blockchain, blockchain)
+                if not blockchain_obj:
+                    raise NotExist('Blockchain {} not exist'.format(blockchain))
+
+                address = Address(
+                    wallet=wallet,
+                    blockchain=blockchain_obj,
+                    add_success=auto
+                )
+                link = 0
+            else:
+                result = await session.execute(
+                    select(func.count(ClusterAddress.id)).filter(
+                        and_(
+                            ClusterAddress.address_id == address.id,
+                            ClusterAddress.cluster_id == cluster_id
+                        )
+                    )
+                )
+                link = result.scalar()
+            if not link:
+                session.add(ClusterAddress(
+                    address=address,
+                    cluster=cluster,
+                    watch=True,
+                    address_name=name or f"{wallet[:7]}...{wallet[-7:]}"
+                ))
+                await session.commit()
+        SubscriptionIndex.invalidate(blockchain, wallet)
+        SubscriptionIndex.invalidate_cluster(cluster_id)
+
+    async def toggle_mute_address(self, address_id: int) -> ClusterAddress:
+        """Toggle mute/unmute"""
+        async with self.get_session() as session:
+            result = await session.execute(
+                select(ClusterAddress).options(
+                    selectinload(ClusterAddress.address).selectinload(Address.blockchain)
+                ).filter(ClusterAddress.id == address_id)
+            )
+            link: ClusterAddress = result.scalars().one_or_none()
+            if not link:
+                raise NotExist('Address for this cluster not exist')
+
+            link.watch = not link.watch
+            await session.commit()
+        SubscriptionIndex.invalidate(link.address.blockchain_id, link.address.wallet)
+        return link
+
+    async def delete_address(self, link_id: int) -> Tuple[int, bool]:
+        """Delete address"""
+        async with self.get_session() as session:
+            link: ClusterAddress = await session.get(ClusterAddress, link_id)
+            if not link:
+                raise NotExist('Link not exist')
+            deleted = False
+            cluster_id = link.cluster_id
+            address: Address = await session.get(Address, link.address_id)
+            await session.delete(link)
+            await session.commit()
+            result = await session.execute(
+                select(func.count(ClusterAddress.id)).filter(ClusterAddress.address_id == address.id)
+            )
+            if not result.scalar():
+                deleted = (address.wallet, address.blockchain_id)
+                await session.delete(address)
+                await session.commit()
+        SubscriptionIndex.invalidate(address.blockchain_id, address.wallet)
+        SubscriptionIndex.invalidate_cluster(cluster_id)
+        return cluster_id, deleted
+
+    @staticmethod
+    def get_alert_recipients_query(address_id: int):
+        """Returns query for clusters watching address with owners, chats and cluster wallets"""
+        cluster_link = aliased(ClusterAddress)
+        cluster_address = aliased(Address)
+        return select(
+            ClusterAddress.id, ClusterAddress.address_name,
+            Cluster.id, Cluster.name, Cluster.watch, Cluster.chats,
+            User.id, User.is_active, User.created_at, User.notifications_remain, User.notification_cost,
+            cluster_address.wallet, Cluster.digest_window
+        ).join(
+            Cluster, Cluster.id == ClusterAddress.cluster_id
+        ).join(
+            User, User.id == Cluster.user_id
+        ).outerjoin(
+            cluster_link, cluster_link.cluster_id == Cluster.id
+        ).outerjoin(
+            cluster_address, cluster_address.id == cluster_link.address_id
+        ).filter(
+            and_(
+                ClusterAddress.address_id == address_id,
+                ClusterAddress.watch == 1
+            )
+        )
+
+    async def get_alert_recipients(self, address_id: int) -> List[AlertRecipient]:
+        """
+        Returns every cluster watching address with its owner state, chats and wallets in one query
+        :param address_id: Address id
+        :return: List[AlertRecipient]
+        """
+        recipients: Dict[int, AlertRecipient] = {}
+        async with self.get_session() as session:
+            for row in await session.execute(self.get_alert_recipients_query(address_id)):
+                recipient = recipients.get(row[0])
+                if not recipient:
+                    recipient = recipients[row[0]] = AlertRecipient(
+                        link_id=row[0],
+                        address_name=row[1],
+                        cluster_id=row[2],
+                        cluster_name=row[3],
+                        cluster_watch=bool(row[4]),
+                        chats=json.loads(row[5]),
+                        user=AlertUser(
+                            id=row[6],
+                            is_active=bool(row[7]),
+                            created_at=row[8],
+                            notifications_remain=row[9],
+                            notification_cost=row[10]
+                        ),
+                        wallets=set(),
+                        digest_window=row[12]
+                    )
+                if row[11]:
+                    recipient.wallets.add(row[11])
+        return list(recipients.values())
+
+    async def load_subscriptions(self) -> None:
+        """Load every address with its watching clusters to the subscription index"""
+        version = SubscriptionIndex.get_version()
+        async with self.get_session() as session:
+            addresses = await session.execute(
+                select(Address.id, Address.wallet, Address.blockchain_id, Address.add_success)
+            )
+            links = await session.execute(
+                select(
+                    ClusterAddress.id, ClusterAddress.address_id, ClusterAddress.address_name,
+                    Cluster.id, Cluster.name, Cluster.watch, Cluster.chats,
+                    User.id, User.is_active, User.created_at, User.notifications_remain, User.notification_cost,
+                    Cluster.digest_window
+                ).join(
+                    Cluster, Cluster.id == ClusterAddress.cluster_id
+                ).join(
+                    User, User.id == Cluster.user_id
+                ).filter(ClusterAddress.watch == 1)
+            )
+            wallets = await session.execute(
+                select(ClusterAddress.cluster_id, Address.wallet).join(Address, Address.id == ClusterAddress.address_id)
+            )
+            cluster_wallets: Dict[int, Set[str]] = {}
+            for cluster_id, wallet in wallets:
+                cluster_wallets.setdefault(cluster_id, set()).add(wallet)
+
+            users: Dict[int, AlertUser] = {}
+            recipients: Dict[int, List[AlertRecipient]] = {}
+            for row in links:
+                user = users.get(row[7])
+                if not user:
+                    user = users[row[7]] = AlertUser(
+                        id=row[7],
+                        is_active=bool(row[8]),
+                        created_at=row[9],
+                        notifications_remain=row[10],
+                        notification_cost=row[11]
+                    )
+                recipients.setdefault(row[1], []).append(AlertRecipient(
+                    link_id=row[0],
+                    address_name=row[2],
+                    cluster_id=row[3],
+                    cluster_name=row[4],
+                    cluster_watch=bool(row[5]),
+                    chats=json.loads(row[6]),
+                    user=user,
+                    wallets=cluster_wallets.get(row[3], set()),
+                    digest_window=row[12]
+                ))
+
+            SubscriptionIndex.set_all([
+                Subscription(
+                    address_id=address_id,
+                    wallet=wallet,
+                    blockchain_id=blockchain_id,
+                    add_success=add_success,
+                    recipients=recipients.get(address_id, [])
+                ) for address_id, wallet, blockchain_id, add_success in addresses
+            ], version)
+
+    async def get_subscription(self, wallet: str, blockchain: int) -> Subscription:
+        """
+        Get watched address with its recipients from the subscription index.
+        Database is queried only for invalidated addresses, periodic refresh runs in background
+        """
+        if SubscriptionIndex.is_expired():
+            refresh = SubscriptionIndex.refresh(self.load_subscriptions)
+            if not SubscriptionIndex.is_loaded():
+                # Nothing to serve before the first load
+                await asyncio.shield(refresh)
+        key = (blockchain, wallet)
+        if SubscriptionIndex.is_stale(key):
+            version = SubscriptionIndex.get_version()
+            try:
+                address = await self.get_address_by_wallet_and_blockchain(wallet, blockchain)
+            except NotExist:
+                SubscriptionIndex.put(blockchain, wallet, None, version)
+            else:
+                SubscriptionIndex.put(blockchain, wallet, Subscription(
+                    address_id=address.id,
+                    wallet=address.wallet,
+                    blockchain_id=address.blockchain_id,
+                    add_success=address.add_success,
+                    recipients=await self.get_alert_recipients(address.id)
+                ), version)
+        subscription = SubscriptionIndex.get(key)
+        if not subscription:
+            raise NotExist('Address not exist')
+        return subscription
+
+
+class AsyncTransactionHandler(AsyncDatabaseHandler):
+    """Transactions database handler"""
+
+    __db_name = 'tracer'
+
+    def __init__(self):
+        super(AsyncTransactionHandler, self).__init__(self.__db_name)
+
+    async def add_transaction(self, data: List[dict]) -> List[int]:
+        """
+        Save transactions for the graph
+        :return: ids of saved transactions
+        """
+        async with self.get_session() as session:
+            transactions = [
+                Transaction(
+                    wallet_1=d['wallet_1'],
+                    wallet_2=d['wallet_2'],
+                    balance=d['balance'],
+                    direction=d['direction'],
+                    token=d['token'],
+                    date=datetime.datetime.utcfromtimestamp(d['date']),
+                    blockchain=d['blockchain']
+                ) for d in data
+            ]
+            session.add_all(transactions)
+            await session.commit()
+        return [x.id for x in transactions]
+
+    @staticmethod
+    def get_edges_query(wallet: str, since: datetime.datetime, limit: int):
+        """Returns query for the newest wallet transactions, each side of the union uses its own index"""
+        columns = (Transaction.id, Transaction.wallet_1, Transaction.wallet_2, Transaction.balance, Transaction.date)
+        sides = [
+            select(*columns).filter(
+                and_(column == wallet, Transaction.date >= since)
+            ).order_by(Transaction.id.desc()).limit(limit).subquery()
+            for column in (Transaction.wallet_1, Transaction.wallet_2)
+        ]
+        edges = union(*[select(side) for side in sides]).subquery()
+        return select(
+            edges.c.id, edges.c.wallet_1, edges.c.wallet_2, edges.c.balance, edges.c.date
+        ).order_by(edges.c.id.desc()).limit(limit)
+
+    async def get_edges(self, wallet: str, since: datetime.datetime,
+                        limit: int) -> List[Tuple[int, str, str, float, datetime.datetime]]:
+        """
+        Returns the newest wallet transactions for the graph
+        :param wallet: wallet address
+        :param since: the oldest transaction date (UTC)
+        :param limit: max number of transactions
+        :return: (id, source, destination, sum, date) ordered from old to new
+        """
+        async with self.get_session() as session:
+            result = await session.execute(self.get_edges_query(wallet, since, limit))
+            return [tuple(row) for row in reversed(result.all())]
+
+
+class BlockchainCache:
+    """In-memory blockchains registry"""
+    __blockchains: Dict[int, Blockchain] = {}
+
+    @classmethod
+    async def load(cls) -> None:
+        """Load blockchains from database"""
+        cls.__blockchains = {x.id: x for x in await AsyncAddressesHandler().get_blockchains()}
+
+    @classmethod
+    async def get(cls, blockchain_id: int) -> Blockchain:
+        """Returns blockchain by id. Reloads registry once if blockchain is unknown"""
+        if blockchain_id not in cls.__blockchains:
+            await cls.load()
+        blockchain = cls.__blockchains.get(blockchain_id)
+        if not blockchain:
+            raise NotExist(f'Blockchain {blockchain_id} not exist')
+        return blockchain
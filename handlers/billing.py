@@ -0,0 +1,121 @@
+"""Billing module"""
+import asyncio
+import datetime
+from typing import Dict, List, Optional, Tuple
+from decimal import Decimal
+
+from config import settings
+from handlers.async_database_handlers import AsyncUsersHandler, SubscriptionIndex
+from logger import LOGGER
+from schema.alert_schema import AlertUser
+
+
+class BillingLedger:
+    """
+    Write-behind ledger for sent notifications.
+    Charges are applied to the in-memory user quota immediately and saved to database
+    in batches every flush interval or when enough rows are accumulated
+    """
+    __alerts: List[dict] = []
+    __charges: Dict[int, Tuple[int, Decimal]] = {}
+    __flush_event: Optional[asyncio.Event] = None
+    __task: Optional[asyncio.Task] = None
+    __stopping = False
+
+    @classmethod
+    def charge(cls, user: AlertUser, blkchn: str, wallet: str) -> None:
+        """Charge user for sent notification"""
+        user.notifications_remain = max(user.notifications_remain - 1, 0)
+        cls.__alerts.append(dict(
+            user_id=user.id,
+            blockchain=blkchn,
+            wallet=wallet,
+            balance_delta=user.notification_cost,
+            created_at=datetime.datetime.now()
+        ))
+        count, amount = cls.__charges.get(user.id, (0, Decimal(0)))
+        cls.__charges[user.id] = (count + 1, amount + user.notification_cost)
+        if len(cls.__alerts) >= settings.billing.flush_rows and cls.__flush_event:
+            cls.__flush_event.set()
+
+    @classmethod
+    async def flush(cls) -> None:
+        """Save accumulated charges"""
+        if not cls.__alerts:
+            return
+        alerts, charges = cls.__alerts, cls.__charges
+        cls.__alerts, cls.__charges = [], {}
+        try:
+            remains = await AsyncUsersHandler().apply_charges(alerts, charges)
+        except asyncio.CancelledError:
+            cls.restore(alerts, charges)
+            raise
+        except Exception as e:
+            LOGGER.error(f'Billing flush failed: {e}')
+            remains = await cls.flush_users(alerts, charges)
+        for user_id, remain in remains.items():
+            # Database value plus charges made while flushing
+            SubscriptionIndex.set_notifications_remain(user_id, remain - cls.__charges.get(user_id, (0,))[0])
+
+    @classmethod
+    async def flush_users(cls, alerts: List[dict], charges: Dict[int, Tuple[int, Decimal]]) -> Dict[int, int]:
+        """
+        Save charges of every user separately, so a failing user does not block the others.
+        Charges of failed users are put back to the ledger
+        :return: {user_id: notifications remain} of saved users
+        """
+        user_alerts: Dict[int, List[dict]] = {}
+        for alert in alerts:
+            user_alerts.setdefault(alert['user_id'], []).append(alert)
+        remains = {}
+        users = list(charges)
+        for i, user_id in enumerate(users):
+            user_charges = {user_id: charges[user_id]}
+            try:
+                remains.update(await AsyncUsersHandler().apply_charges(user_alerts.get(user_id, []), user_charges))
+            except asyncio.CancelledError:
+                for rest in users[i:]:
+                    cls.restore(user_alerts.get(rest, []), {rest: charges[rest]})
+                raise
+            except Exception as e:
+                LOGGER.error(f'Billing flush of user {user_id} failed: {e}')
+                cls.restore(user_alerts.get(user_id, []), user_charges)
+        return remains
+
+    @classmethod
+    def restore(cls, alerts: List[dict], charges: Dict[int, Tuple[int, Decimal]]) -> None:
+        """Put not saved charges back ahead of charges made while flushing"""
+        cls.__alerts = alerts + cls.__alerts
+        for user_id, (count, amount) in charges.items():
+            new_count, new_amount = cls.__charges.get(user_id, (0, Decimal(0)))
+            cls.__charges[user_id] = (count + new_count, amount + new_amount)
+
+    @classmethod
+    async def run(cls) -> None:
+        """Flush loop"""
+        while not cls.__stopping:
+            try:
+                await asyncio.wait_for(cls.__flush_event.wait(), settings.billing.flush_interval_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            cls.__flush_event.clear()
+            await cls.flush()
+
+    @classmethod
+    def start(cls) -> None:
+        """Start flush loop"""
+        if cls.__task is None:
+            cls.__flush_event = asyncio.Event()
+            cls.__task = asyncio.create_task(cls.run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Stop flush loop and save the rest of charges"""
+        if cls.__task is not None:
+            # Running flush is not cancelled, the loop exits after it
+            cls.__stopping = True
+            cls.__flush_event.set()
+            await asyncio.gather(cls.__task, return_exceptions=True)
+            cls.__task = None
+            cls.__stopping = False
+        await cls.flush()
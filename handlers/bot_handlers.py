@@ -1,34 +1,43 @@
 """Bot handlers module"""
+import asyncio
 import csv
 import datetime
+import functools
+import io
 import json
 import math
-from typing import Tuple, List
+from typing import Dict, Tuple, List, Optional, Set, Union
 
 from aiogram import types, Bot
-from sqlalchemy.orm import Session
+from aiogram.utils.exceptions import Unauthorized, ChatNotFound
 
-from config import PATH
-from database.factory import DatabaseFactory
+from config import PATH, settings
 from database.models import User, Cluster, Blockchain, ClusterAddress, Address, Transaction
 from exceptions import NotExist
-from handlers.database_handlers import AddressesHandler, ClusterHandler, UsersHandler, TransactionHandler
+from handlers.async_database_handlers import AsyncAddressesHandler, AsyncClusterHandler, AsyncUsersHandler, \
+    AsyncTransactionHandler, BlockchainCache
+from handlers.billing import BillingLedger
+from handlers.delivery import DeliveryScheduler
+from handlers.digest import AlertDigest
+from handlers.edge_cache import EdgeCache
 from logger import LOGGER
+from schema.alert_schema import Subscription, AlertRecipient
 from schema.bot_schema import CallbackDataModel
 from schema.kafka_schema import Incoming, Transaction
 from exchange_and_bridge_controller import Controller
-from graphs.graph import Graph
+from graphs.graph import Graph, OTHER
+from graphs.layout import LayoutCache
+from graphs.render_service import RenderService, RenderCoalescer, DebugImageCache, get_extension
 import time
 
 
 class KeyboardConstructor:
     """Handler to create messages with keyboards or single keyboards"""
-    _engine = DatabaseFactory.get_sync_engine('tracer')
 
     @classmethod
-    def create_alert_history_report(cls, user_id: int) -> str:
+    async def create_alert_history_report(cls, user_id: int) -> str:
         """Creates report for user alert history"""
-        history = UsersHandler().get_alert_history(user_id)
+        history = await AsyncUsersHandler().get_alert_history(user_id)
         filename = f'{PATH}/history_{user_id}.csv'
         with open(filename, 'w', encoding='utf-8') as f:
             keys = ['Blockchain', 'Wallet', 'Balance delta', 'Date']
@@ -90,13 +99,18 @@ class KeyboardConstructor:
         ], resize_keyboard=True)
         return buttons
 
+    @staticmethod
+    def get_added_count(cluster: Cluster) -> int:
+        """Returns count of successfully added addresses of cluster loaded with addresses"""
+        return sum(1 for x in cluster.addresses if x.address.add_success)
+
     @classmethod
     def get_addresses_list(
             cls, cluster: Cluster, page: int = None
        ) -> Tuple[str, types.InlineKeyboardMarkup]:
         """
         Get cluster and returns message with list of cluster addresses and inline keyboard
-        :param cluster: Cluster
+        :param cluster: Cluster loaded with addresses
         :param page: int or None
         :return: Tuple[str, InlineKeyboardMarkup]
         """
@@ -105,14 +119,12 @@ class KeyboardConstructor:
             page = 1
         end = page * per_page
         start = end - per_page
-        with Session(bind=cls._engine) as session:
-            session.add(cluster)
-            addresses = [x for x in cluster.addresses if x.address.add_success]
-            pages = math.ceil(len(addresses) / per_page)
-            msg = [f'🏠<b>Addresses: (page {page} of {pages})</b>']
-            for link in addresses[start:end]:
-                row = f"{link.address.wallet[:5]}...{link.address.wallet[-5:]} /address_{link.id}"
-                msg.append(row)
+        addresses = [x for x in cluster.addresses if x.address.add_success]
+        pages = math.ceil(len(addresses) / per_page)
+        msg = [f'🏠<b>Addresses: (page {page} of {pages})</b>']
+        for link in addresses[start:end]:
+            row = f"{link.address.wallet[:5]}...{link.address.wallet[-5:]} /address_{link.id}"
+            msg.append(row)
 
         markup = types.InlineKeyboardMarkup(inline_keyboard=[])
         buttons = []
@@ -133,73 +145,66 @@ class KeyboardConstructor:
     def get_clusters_list(cls, user: User) -> str:
         """
         Get user and returns message contains list of user clusters
-        :param user: User - BTrace client instance
+        :param user: User - BTrace client instance loaded with clusters and their addresses
         :return: str
         """
         msg = []
-        with Session(bind=cls._engine) as session:
-            session.add(user)
-            for cluster in user.clusters:
-                ids = [x.address_id for x in cluster.addresses]
-                len_addresses = AddressesHandler().get_added_count(ids)
-                row = '{} ({}) /cluster_{}'.format(
-                        cluster.name,
-                        len_addresses,
-                        cluster.id
-                    )
-                msg.append(row)
+        for cluster in user.clusters:
+            row = '{} ({}) /cluster_{}'.format(
+                    cluster.name,
+                    cls.get_added_count(cluster),
+                    cluster.id
+                )
+            msg.append(row)
         return '\n'.join(msg)
 
     @classmethod
     def get_address_detail(cls, address: ClusterAddress) -> Tuple[str, types.InlineKeyboardMarkup]:
-        """Get address link and returns message and keyboard"""
-        blockchain = AddressesHandler().get_blockchain_by_id(address.address.blockchain_id)
-        with Session(bind=cls._engine) as session:
-            session.add(address)
-            msg = '🏠<b>Address</b>:\n<code>{}</code>\n<a href="{}{}">' \
-                'Watch on {}</a>\n🏷<b>Name:</b> {}\n🔗<b>Blockchain: </b>{}\n👀<b>Tracking: </b>{}'.format(
-                    address.address.wallet,
-                    blockchain.explorer_link_template,
-                    address.address.wallet,
-                    blockchain.explorer_title,
-                    address.address_name,
-                    f"{blockchain.title} ({blockchain.tag})",
-                    f"{'✅' if address.watch else '❌'}{address.watch}"
-                )
-            buttons_data = [
-                ('🏷Rename', 'rename_address', address.id),
-                ('🔇Mute' if address.watch else '🔊Unmute', 'toggle_mute_address', address.id),
-                ('🚫Delete', 'delete_address', address.id),
-                ('🔙Back', 'view_addresses', address.cluster_id)
-            ]
-            markup = types.InlineKeyboardMarkup(inline_keyboard=[
-                [cls.get_inline_button(*x) for x in buttons_data[:2]],
-                [cls.get_inline_button(*x) for x in buttons_data[2:]]
-            ])
+        """Get address link loaded with address and blockchain and returns message and keyboard"""
+        blockchain = address.address.blockchain
+        msg = '🏠<b>Address</b>:\n<code>{}</code>\n<a href="{}{}">' \
+            'Watch on {}</a>\n🏷<b>Name:</b> {}\n🔗<b>Blockchain: </b>{}\n👀<b>Tracking: </b>{}'.format(
+                address.address.wallet,
+                blockchain.explorer_link_template,
+                address.address.wallet,
+                blockchain.explorer_title,
+                address.address_name,
+                f"{blockchain.title} ({blockchain.tag})",
+                f"{'✅' if address.watch else '❌'}{address.watch}"
+            )
+        buttons_data = [
+            ('🏷Rename', 'rename_address', address.id),
+            ('🔇Mute' if address.watch else '🔊Unmute', 'toggle_mute_address', address.id),
+            ('🚫Delete', 'delete_address', address.id),
+            ('🔙Back', 'view_addresses', address.cluster_id)
+        ]
+        markup = types.InlineKeyboardMarkup(inline_keyboard=[
+            [cls.get_inline_button(*x) for x in buttons_data[:2]],
+            [cls.get_inline_button(*x) for x in buttons_data[2:]]
+        ])
         return msg, markup
 
     @classmethod
     def get_cluster_detail(cls, cluster: Cluster) -> Tuple[str, types.InlineKeyboardMarkup]:
-        """Returns cluster detail message and inline keyboard"""
-        with Session(bind=cls._engine) as session:
-            session.add(cluster)
-            ids = [x.address_id for x in cluster.addresses]
-            msg = '🏷<b>Name:</b>{}\n🔢<b>Addresses count:</b> {}\n👀<b>Tracking: </b>{}'.format(
-                cluster.name,
-                AddressesHandler().get_added_count(ids),
-                f"{'✅'if cluster.watch else '❌'}{cluster.watch}"
-            )
-            buttons_data = [
-                ('👁‍🗨View addresses', 'view_addresses'),
-                ('➕Add address', 'add_address'),
-                ('🔇Mute' if cluster.watch else '🔊Unmute', 'toggle_mute_cluster'),
-                ('🏷Rename', 'rename_cluster'),
-                ('🚫Delete', 'delete_cluster'),
-            ]
-            markup = types.InlineKeyboardMarkup(inline_keyboard=[
-                [cls.get_inline_button(x, y, cluster.id) for x, y in buttons_data[:3]],
-                [cls.get_inline_button(x, y, cluster.id) for x, y in buttons_data[3:]]
-            ])
+        """Returns cluster detail message and inline keyboard. Cluster must be loaded with addresses"""
+        msg = '🏷<b>Name:</b>{}\n🔢<b>Addresses count:</b> {}\n👀<b>Tracking: </b>{}\n📦<b>Digest: </b>{}'.format(
+            cluster.name,
+            cls.get_added_count(cluster),
+            f"{'✅'if cluster.watch else '❌'}{cluster.watch}",
+            f'every {cluster.digest_window}s' if cluster.digest_window else 'off'
+        )
+        buttons_data = [
+            ('👁‍🗨View addresses', 'view_addresses'),
+            ('➕Add address', 'add_address'),
+            ('🔇Mute' if cluster.watch else '🔊Unmute', 'toggle_mute_cluster'),
+            ('🏷Rename', 'rename_cluster'),
+            ('📦Digest off' if cluster.digest_window else '📦Digest on', 'toggle_digest_cluster'),
+            ('🚫Delete', 'delete_cluster'),
+        ]
+        markup = types.InlineKeyboardMarkup(inline_keyboard=[
+            [cls.get_inline_button(x, y, cluster.id) for x, y in buttons_data[:3]],
+            [cls.get_inline_button(x, y, cluster.id) for x, y in buttons_data[3:]]
+        ])
         return msg, markup
 
     @classmethod
@@ -218,7 +223,12 @@ class KeyboardConstructor:
         return markup
 
 
+# Chat of delivered entries for recipients charged without sending to chats: digests and clusters without chats
+NO_CHAT = 0
+
+
 class NotificationHandler:
+    __fanout: Optional[asyncio.Semaphore] = None
 
     @staticmethod
     def get_link(href: str, verbose: str) -> str:
@@ -235,7 +245,7 @@ class NotificationHandler:
             wallet: str,
             transaction: Transaction,
             blockchain: Blockchain,
-            cluster: Cluster,
+            cluster_name: str,
             name: str,
     ) -> str:
         """Returns message for transaction"""
@@ -246,7 +256,7 @@ class NotificationHandler:
             tx_link += tx_hash
         msg = '📍Transaction: {}\n🔒Cluster: {}\n🔗Blockchain: {}\n📤Sender: {}\n📥Receiver: {}\n💰VALUE: {:.2f} {}\n⏱TIME (UTC): {}'.format(
             cls.get_link(tx_link, 'Watch on ' + blockchain.explorer_title),
-            cluster.name,
+            cluster_name,
             f"{blockchain.title} ({blockchain.tag})",
             cls.get_link(
                 blockchain.explorer_link_template + transaction.src,
@@ -264,6 +274,44 @@ class NotificationHandler:
         )
         return msg
 
+    @classmethod
+    def format_digest_message(cls, wallet: str, transactions: List[Transaction], blockchain: Blockchain,
+                              cluster_name: str, name: str) -> str:
+        """Returns message for transactions of digest window, only the latest ones are listed"""
+        msg = ['📦Digest: {} transactions\n🔒Cluster: {}\n🔗Blockchain: {}\n👛Wallet: {}\n'.format(
+            len(transactions),
+            cluster_name,
+            f"{blockchain.title} ({blockchain.tag})",
+            cls.get_link(blockchain.explorer_link_template + wallet, f'{wallet[:5]}...{wallet[-5:]} {name}')
+        )]
+        max_lines = settings.digest.max_lines
+        if len(transactions) > max_lines:
+            msg.append(f'...{len(transactions) - max_lines} earlier')
+        sent: Dict[str, float] = {}
+        received: Dict[str, float] = {}
+        for transaction in transactions:
+            totals = sent if transaction.src == wallet else received
+            totals[transaction.token] = totals.get(transaction.token, 0) + transaction.value
+        for transaction in transactions[-max_lines:]:
+            counterparty = transaction.dst if transaction.src == wallet else transaction.src
+            tx_time = datetime.datetime.fromtimestamp(transaction.created_at).strftime('%H:%M:%S')
+            if blockchain.tx_link_template and transaction.tx_hash:
+                tx_time = cls.get_link(blockchain.tx_link_template + transaction.tx_hash, tx_time)
+            msg.append('{} {:.2f} {} {} {}'.format(
+                '📤' if transaction.src == wallet else '📥',
+                transaction.value,
+                transaction.token,
+                cls.get_link(
+                    blockchain.explorer_link_template + counterparty,
+                    f'{counterparty[:5]}...{counterparty[-5:]}'
+                ),
+                tx_time
+            ))
+        for title, totals in (('Sent', sent), ('Received', received)):
+            if totals:
+                msg.append('\n💰{}: {}'.format(title, ', '.join(f'{v:.2f} {k}' for k, v in totals.items())))
+        return '\n'.join(msg)
+
     @staticmethod
     def get_auto_add_message(wallets: List[str], blockchain: str, name: str) -> str:
         """Create message about auto added addresses"""
@@ -275,99 +323,256 @@ class NotificationHandler:
             ))
         return '\n'.join(msg)
 
+    @staticmethod
+    async def render_graph(wallet: str, blockchain: Blockchain, transaction: Transaction) -> bytes:
+        """
+        Render wallet graph up to the transaction
+        :param wallet: alerted wallet
+        :param blockchain: wallet blockchain
+        :param transaction: alerted transaction
+        :return: PNG or JPEG bytes
+        """
+        transactions = await EdgeCache.get(wallet)
+        graph = Graph.get_edges(transactions, transaction.created_at)
+        if not graph:
+            # Transaction is older than the graph window or than the cached edges
+            graph = [(transaction.src, transaction.dst, transaction.value)]
+        edges = Graph.aggregate(graph)
+        simplified = Graph.simplify(edges, settings.graph.draw_edges, settings.graph.draw_nodes)
+        if settings.graph.merge_labeled:
+            labels = {}
+            for node in set(simplified.src) | set(simplified.dst):
+                if node not in (wallet, OTHER):
+                    label = await Controller.get_label(node, blockchain.title)
+                    if label:
+                        labels[node] = label
+            if labels:
+                simplified = Graph.simplify(edges, settings.graph.draw_edges, settings.graph.draw_nodes, labels)
+        edges = simplified
+        nodes = [node for pair in zip(edges.src, edges.dst) for node in pair]
+        image = await RenderService.render(edges, LayoutCache.get_positions(wallet, nodes))
+        DebugImageCache.put(f'{wallet}-{transaction.tx_hash}', image)
+        return image
+
+    @staticmethod
+    async def send_photo(bot: Bot, chat: int, caption: str, markup: Optional[types.InlineKeyboardMarkup],
+                         photo: Union[str, bytes]) -> types.Message:
+        """
+        Send graph photo
+        :param photo: file_id of uploaded photo or image bytes to upload
+        """
+        if isinstance(photo, str):
+            return await bot.send_photo(chat_id=chat, caption=caption, parse_mode='HTML',
+                                        reply_markup=markup, photo=photo)
+        file = types.InputFile(io.BytesIO(photo), filename=f'graph.{get_extension(photo)}')
+        try:
+            return await bot.send_photo(chat_id=chat, caption=caption, parse_mode='HTML',
+                                        reply_markup=markup, photo=file)
+        finally:
+            file.file.close()
+
     @classmethod
-    async def alert(cls, address: Address, data: Incoming, bot: Bot, addresses_handler: AddressesHandler):
-        """Handle alert incoming message"""
-        session = DatabaseFactory.get_sync_session('tracer')
-        users_handler = UsersHandler()
+    async def send_digest(cls, bot: Bot, recipient: AlertRecipient, wallet: str, blockchain_id: int,
+                          transactions: List[Transaction], sent: Set[int]) -> None:
+        """
+        Send collected transactions as one message with graph up to the latest one and charge once
+        :param sent: chats the digest was already sent to, updated with chats it is sent to
+        """
+        if not recipient.send_allowed:
+            return
+        blockchain = await BlockchainCache.get(blockchain_id)
+        transactions = sorted(transactions, key=lambda x: x.created_at)
+        msg = cls.format_digest_message(wallet, transactions, blockchain, recipient.cluster_name,
+                                        recipient.address_name)
+        photo = await RenderCoalescer.render(
+            wallet, transactions[-1], functools.partial(cls.render_graph, wallet, blockchain)
+        )
+        error = None
+        for chat in recipient.chats:
+            if chat in sent:
+                continue
+            try:
+                message = await DeliveryScheduler.submit(
+                    chat, functools.partial(cls.send_photo, bot, chat, msg, None, photo)
+                )
+                photo = message.photo[-1].file_id
+            except (Unauthorized, ChatNotFound) as e:
+                LOGGER.error(f'{chat}: {e}')
+            except Exception as e:
+                # The other chats are still sent, the failed ones are retried
+                error = e
+                continue
+            sent.add(chat)
+        if error:
+            raise error
+        BillingLedger.charge(recipient.user, blockchain.title, wallet)
+
+    @classmethod
+    def get_fanout(cls) -> asyncio.Semaphore:
+        """Returns limit of concurrent alert sends"""
+        if cls.__fanout is None:
+            cls.__fanout = asyncio.Semaphore(settings.delivery.fanout)
+        return cls.__fanout
+
+    @classmethod
+    async def alert(cls, address: Subscription, data: Incoming, bot: Bot, addresses_handler: AsyncAddressesHandler):
+        """Handle alert incoming message. Chats are sent concurrently, every chat gets transactions in order"""
         try:
-            links = addresses_handler.get_links_by_address_id(address.id)
-
-            for link in links:
-                link_chats = json.loads(link.cluster.chats)
-
-                user = users_handler.get_user_by_id(link.cluster.user_id)
-
-                send_allowed = all([link.watch, user.is_active, user.notifications_remain,
-                                    link.cluster.watch])
-                if send_allowed:
-                    session.add(link.cluster)
-                    addresses = set(x.address for x in link.cluster.addresses)
-                    for transaction in data.transactions:
-                        msg = await cls.format_transaction_message(
-                            tx_hash=transaction.tx_hash,
-                            wallet=data.wallet,
-                            transaction=transaction,
-                            blockchain=address.blockchain,
-                            cluster=link.cluster,
-                            name=link.address_name
+            blockchain = await BlockchainCache.get(address.blockchain_id)
+            # {chat: [(recipient link, transaction index, transaction, caption, markup)]}
+            # in order of recipients and transactions. Transaction hash is optional, transactions are keyed by index
+            chats: Dict[int, List[Tuple[int, int, Transaction, str, types.InlineKeyboardMarkup]]] = {}
+            # Recipient is charged for transaction when it is sent to all recipient chats
+            pending: Dict[Tuple[int, int], List] = {}
+            planned: Dict[int, int] = {}
+            # Sends done by the previous attempts of the message
+            delivered = set(data.delivered)
+            for recipient in address.recipients:
+                if recipient.digest_window:
+                    indexes = [
+                        i for i in range(len(data.transactions)) if (recipient.link_id, NO_CHAT, i) not in delivered
+                    ]
+                    if recipient.send_allowed and indexes:
+                        AlertDigest.add(recipient, data.wallet, address.blockchain_id,
+                                        [data.transactions[i] for i in indexes],
+                                        functools.partial(cls.send_digest, bot))
+                        data.delivered.extend((recipient.link_id, NO_CHAT, i) for i in indexes)
+                    continue
+                for index, transaction in enumerate(data.transactions):
+                    if not recipient.send_allowed:
+                        continue
+                    recipient_chats = [
+                        x for x in recipient.chats or [NO_CHAT] if (recipient.link_id, x, index) not in delivered
+                    ]
+                    if not recipient_chats:
+                        # Sent and charged by the previous attempt
+                        continue
+                    if recipient.user.notifications_remain <= planned.get(recipient.user.id, 0):
+                        continue
+                    planned[recipient.user.id] = planned.get(recipient.user.id, 0) + 1
+                    msg = await cls.format_transaction_message(
+                        tx_hash=transaction.tx_hash,
+                        wallet=data.wallet,
+                        transaction=transaction,
+                        blockchain=blockchain,
+                        cluster_name=recipient.cluster_name,
+                        name=recipient.address_name
+                    )
+                    markup = types.InlineKeyboardMarkup(inline_keyboard=[])
+                    if transaction.dst not in recipient.wallets:
+                        button = KeyboardConstructor.get_inline_button(
+                            text='➕Add address to trace',
+                            action='add_address',
+                            data=recipient.cluster_id,
+                            blk=address.blockchain_id
                         )
-                        markup = types.InlineKeyboardMarkup(inline_keyboard=[])
-                        if transaction.dst not in addresses:
-                            button = KeyboardConstructor.get_inline_button(
-                                text='➕Add address to trace',
-                                action='add_address',
-                                data=link.cluster_id,
-                                blk=address.blockchain_id
+                        markup.inline_keyboard.append([button])
+                    if not recipient.chats:
+                        BillingLedger.charge(recipient.user, blockchain.title, data.wallet)
+                        data.delivered.append((recipient.link_id, NO_CHAT, index))
+                        continue
+                    pending[(recipient.link_id, index)] = [len(recipient_chats), recipient]
+                    for chat in recipient_chats:
+                        chats.setdefault(chat, []).append((recipient.link_id, index, transaction, msg, markup))
+
+            # Every graph is rendered once and uploaded by the first chat, other chats reuse its file_id
+            images: Dict[int, asyncio.Task] = {}
+            # Merged renders return the same image, uploads are keyed by image so it is uploaded once
+            uploads: Dict[bytes, asyncio.Future] = {}
+
+            def get_image(index: int) -> asyncio.Task:
+                if index not in images:
+                    images[index] = asyncio.ensure_future(RenderCoalescer.render(
+                        data.wallet, data.transactions[index],
+                        functools.partial(cls.render_graph, data.wallet, blockchain)
+                    ))
+                return images[index]
+
+            # Renders of all transactions are requested at once, so close ones are merged into one render
+            for items in chats.values():
+                for _, index, _, _, _ in items:
+                    get_image(index)
+
+            async def send(chat: int, index: int, msg: str, markup: types.InlineKeyboardMarkup):
+                image = await asyncio.shield(get_image(index))
+                upload = uploads.get(image)
+                while upload is not None:
+                    file_id = await asyncio.shield(upload)
+                    if file_id is not None:
+                        async with cls.get_fanout():
+                            await DeliveryScheduler.submit(
+                                chat, functools.partial(cls.send_photo, bot, chat, msg, markup, file_id)
                             )
-                            markup.inline_keyboard.append([button])
-                        gr = Graph()
-                        for chat in link_chats:
-                            now = gr.draw_graph(data.wallet, user.id ,user.created_at, transaction.created_at )
-                            photo = open(f'{PATH}/graphs/img/{user.id}-{transaction.created_at}-{now}.jpg', 'rb')
-                            # SVG/GIF
-                            #first transaction -> another colors
-                            await bot.send_photo(chat_id=chat, caption = msg, parse_mode='HTML', reply_markup=markup,
-                            photo=photo)
-                        user = users_handler.reduce_balance(user, address.blockchain.title, data.wallet)
+                        return
+                    # Upload failed, the first of waiting chats uploads the image
+                    upload = uploads.get(image)
+                upload = uploads[image] = asyncio.get_running_loop().create_future()
+                try:
+                    async with cls.get_fanout():
+                        message = await DeliveryScheduler.submit(
+                            chat, functools.partial(cls.send_photo, bot, chat, msg, markup, image)
+                        )
+                except BaseException:
+                    del uploads[image]
+                    upload.set_result(None)
+                    raise
+                upload.set_result(message.photo[-1].file_id)
+
+            async def deliver(chat: int, items: List[Tuple[int, int, Transaction, str, types.InlineKeyboardMarkup]]):
+                for link_id, index, transaction, msg, markup in items:
+                    # SVG/GIF
+                    #first transaction -> another colors
+                    try:
+                        await send(chat, index, msg, markup)
+                    except (Unauthorized, ChatNotFound) as e:
+                        # Chat will never accept the message, retrying is pointless
+                        LOGGER.error(f'{chat}: {e}')
+                    data.delivered.append((link_id, chat, index))
+                    waiting = pending[(link_id, index)]
+                    waiting[0] -= 1
+                    if not waiting[0]:
+                        BillingLedger.charge(waiting[1].user, blockchain.title, data.wallet)
+
+            results = await asyncio.gather(
+                *(deliver(chat, items) for chat, items in chats.items()), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
 
         except Exception as e:
             LOGGER.error(str(e))
-        finally:
-            session.close_all()
-            users_handler.session.dispose()
+            raise
 
     @classmethod
-    async def report(cls, address: Address, data: Incoming, bot: Bot, addresses_handler: AddressesHandler):
+    async def report(cls, address: Subscription, data: Incoming, bot: Bot, addresses_handler: AsyncAddressesHandler):
         """Handle report"""
 
         if data.action == 'add_address':
             if data.state == 1:
                 result = 'added to tracing'
-                try:
-                    name, chats = addresses_handler.add_success(address, data.cluster_id, True)
-                except Exception as e:
-                    LOGGER.error(str(e))
-                    return
+                name, chats = await addresses_handler.add_success(address, data.cluster_id, True)
             else:
                 result = 'If something goes wrong, please contact administration'
+                cluster = await AsyncClusterHandler().get_cluster_by_id(data.cluster_id)
+                chats = json.loads(cluster.chats)
+                name = cluster.name
+            blockchain = await BlockchainCache.get(data.blockchain)
+            for chat in chats:
                 try:
-                    cluster = ClusterHandler().get_cluster_by_id(data.cluster_id)
+                    await DeliveryScheduler.submit(chat, functools.partial(
+                        bot.send_message,
+                        chat_id=chat,
+                        text=f'{name}:\n{data.wallet[:5]}...{data.wallet[-5:]} ({blockchain.tag})\n{result}'
+                    ), DeliveryScheduler.REPORT)
                 except Exception as e:
                     LOGGER.error(str(e))
-                    return
-                chats = json.loads(cluster.chats)
-                name = cluster.name
-            try:
-                blockchain = addresses_handler.get_blockchain_by_id(data.blockchain)
-            except Exception as e:
-                LOGGER.error(str(e))
-            else:
-                for chat in chats:
-                    try:
-                        await bot.send_message(
-                            chat_id=chat,
-                            text=f'{name}:\n{data.wallet[:5]}...{data.wallet[-5:]} ({blockchain.tag})\n{result}'
-                        )
-                    except Exception as e:
-                        LOGGER.error(str(e))
 
     @classmethod
-    async def handle_notification(cls, data: Incoming, bot: Bot, addresses_handler: AddressesHandler):
+    async def handle_notification(cls, data: Incoming, bot: Bot, addresses_handler: AsyncAddressesHandler):
         """Handle notification"""
-        # addresses_handler = AddressesHandler()
         try:
-            address = addresses_handler.get_address_by_wallet_and_blockchain(
+            address = await addresses_handler.get_subscription(
                 wallet=data.wallet,
                 blockchain=data.blockchain
             )
@@ -375,10 +580,11 @@ class NotificationHandler:
             return data
         except Exception as e:
             LOGGER.error(str(e))
+            raise
         else:
             if data.action == 'alert':
                 # add new trx in tracer.transactions
-                tr_handler = TransactionHandler()
+                tr_handler = AsyncTransactionHandler()
                 # compare address with data.transaction. Maybe you shoud use for circle
                 LOGGER.info(f'address: {address}, data: {data}, bot: {bot}, addresses_handler: {addresses_handler}')
                 transaction_list = []
@@ -392,13 +598,17 @@ class NotificationHandler:
                     data_new['token'] = transaction.token
                     data_new['date'] = transaction.created_at
                     transaction_list.append(data_new)
-                tr_handler.add_transaction(transaction_list)
+                if not data.stored:
+                    ids = await tr_handler.add_transaction(transaction_list)
+                    EdgeCache.add([
+                        (x['wallet_1'], x['wallet_2'], x['balance'], datetime.datetime.utcfromtimestamp(x['date']))
+                        for x in transaction_list
+                    ], ids)
+                    data.stored = True
                 handler = cls.alert
             else:
                 handler = cls.report
             await handler(address, data, bot, addresses_handler)
-        # finally:
-            # addresses_handler.session.dispose()
 
         # LOGGER.info(f'transaction.dst: {transaction.dst}')
         # src_name = ' '
@@ -18,6 +18,7 @@ class DatabaseHandler:
     __db_name = None
 
     def __init__(self, name: str):
+        # Shared pooled engine, must not be disposed by handlers
         self.session = DatabaseFactory.get_sync_engine(name)
 
     @staticmethod
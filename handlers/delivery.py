@@ -0,0 +1,216 @@
+"""Telegram messages delivery"""
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Set
+
+from aiogram.utils.exceptions import RetryAfter, RestartingTelegram
+
+from config import settings
+from logger import LOGGER
+
+# Number of per-chat limits kept in memory before idle ones are dropped
+MAX_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Rate limit of `rate` requests per second with bursts up to `capacity` requests"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Add tokens for the time passed"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def get_delay(self, now: float) -> float:
+        """Returns seconds until a request is allowed"""
+        self.refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """Spend token of allowed request"""
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Allow no requests for the next seconds"""
+        self.refill(time.monotonic())
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self, now: float) -> bool:
+        """Bucket that has not been used recently"""
+        self.refill(now)
+        return self.tokens >= self.capacity
+
+
+class Delivery(NamedTuple):
+    """Queued request"""
+    chat_id: int
+    send: Callable[[], Awaitable[Any]]
+    future: asyncio.Future
+    priority: int
+
+
+class DeliveryScheduler:
+    """
+    Sends Telegram requests within the global and per-chat limits.
+    Alerts are sent ahead of reports, requests of the same chat and priority are sent in order.
+    Requests rejected by flood control are sent again after the time requested by Telegram
+    """
+    ALERT = 0
+    REPORT = 1
+
+    __lanes: List['OrderedDict[int, Deque[Delivery]]'] = [OrderedDict(), OrderedDict()]
+    __buckets: Dict[int, TokenBucket] = {}
+    __global: Optional[TokenBucket] = None
+    __busy: Set[int] = set()
+    __sending: Set[asyncio.Task] = set()
+    __wakeup: Optional[asyncio.Event] = None
+    __task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def submit(cls, chat_id: int, send: Callable[[], Awaitable[Any]], priority: int = ALERT) -> asyncio.Future:
+        """
+        Queue request
+        :param chat_id: destination chat, limits are applied per chat
+        :param send: creates request coroutine, called again when request is retried
+        :param priority: ALERT or REPORT
+        :return: future of request result
+        """
+        if cls.__task is None:
+            cls.start()
+        future = asyncio.get_running_loop().create_future()
+        cls.__lanes[priority].setdefault(chat_id, deque()).append(Delivery(chat_id, send, future, priority))
+        cls.__wakeup.set()
+        return future
+
+    @staticmethod
+    def create_bucket(chat_id: int) -> TokenBucket:
+        """Chat limit. Group and channel ids are negative"""
+        if chat_id < 0:
+            return TokenBucket(settings.delivery.group_per_minute / 60)
+        return TokenBucket(settings.delivery.chat_rate)
+
+    @classmethod
+    def get_bucket(cls, chat_id: int) -> TokenBucket:
+        """Returns chat limit"""
+        bucket = cls.__buckets.get(chat_id)
+        if bucket is None:
+            if len(cls.__buckets) >= MAX_BUCKETS:
+                # Full bucket of idle chat is the same as a new one
+                now = time.monotonic()
+                cls.__buckets = {k: v for k, v in cls.__buckets.items() if k in cls.__busy or not v.is_full(now)}
+            bucket = cls.__buckets[chat_id] = cls.create_bucket(chat_id)
+        return bucket
+
+    @classmethod
+    def dispatch(cls) -> Optional[float]:
+        """
+        Start all requests allowed now
+        :return: seconds until the next request is allowed, None to wait for a new or finished request
+        """
+        now = time.monotonic()
+        delay = None
+        for lane in cls.__lanes:
+            for chat_id in list(lane):
+                if len(cls.__sending) >= settings.delivery.max_in_flight:
+                    return None
+                global_delay = cls.__global.get_delay(now)
+                if global_delay > 0:
+                    return global_delay
+                if chat_id in cls.__busy:
+                    continue
+                bucket = cls.get_bucket(chat_id)
+                chat_delay = bucket.get_delay(now)
+                if chat_delay > 0:
+                    delay = chat_delay if delay is None else min(delay, chat_delay)
+                    continue
+                deliveries = lane[chat_id]
+                delivery = deliveries.popleft()
+                if deliveries:
+                    # Other chats go first
+                    lane.move_to_end(chat_id)
+                else:
+                    del lane[chat_id]
+                if delivery.future.cancelled():
+                    continue
+                cls.__global.take()
+                bucket.take()
+                cls.__busy.add(chat_id)
+                task = asyncio.create_task(cls.deliver(delivery))
+                cls.__sending.add(task)
+                task.add_done_callback(cls.__sending.discard)
+        return delay
+
+    @classmethod
+    def requeue(cls, delivery: Delivery) -> None:
+        """Put request back ahead of other chat requests"""
+        cls.__lanes[delivery.priority].setdefault(delivery.chat_id, deque()).appendleft(delivery)
+
+    @classmethod
+    async def deliver(cls, delivery: Delivery) -> None:
+        """Send request and resolve its future"""
+        try:
+            result = await delivery.send()
+        except asyncio.CancelledError:
+            delivery.future.cancel()
+            raise
+        except RetryAfter as e:
+            LOGGER.warning(f'{delivery.chat_id}: flood control, retry in {e.timeout}s')
+            cls.get_bucket(delivery.chat_id).pause(e.timeout)
+            cls.requeue(delivery)
+        except RestartingTelegram as e:
+            LOGGER.warning(str(e))
+            cls.__global.pause(settings.delivery.restart_delay_s)
+            cls.requeue(delivery)
+        except Exception as e:
+            if not delivery.future.done():
+                delivery.future.set_exception(e)
+        else:
+            if not delivery.future.done():
+                delivery.future.set_result(result)
+        finally:
+            cls.__busy.discard(delivery.chat_id)
+            cls.__wakeup.set()
+
+    @classmethod
+    async def run(cls) -> None:
+        """Dispatch loop"""
+        while True:
+            cls.__wakeup.clear()
+            delay = cls.dispatch()
+            try:
+                await asyncio.wait_for(cls.__wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    def start(cls) -> None:
+        """Start dispatch loop"""
+        if cls.__task is None:
+            cls.__global = TokenBucket(settings.delivery.rate)
+            cls.__wakeup = asyncio.Event()
+            cls.__task = asyncio.create_task(cls.run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Send queued requests for at most delivery.drain_s seconds, then stop dispatch loop"""
+        if cls.__task is None:
+            return
+        deadline = time.monotonic() + settings.delivery.drain_s
+        while (any(cls.__lanes) or cls.__sending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        cls.__task.cancel()
+        for task in list(cls.__sending):
+            task.cancel()
+        await asyncio.gather(cls.__task, *cls.__sending, return_exceptions=True)
+        cls.__task = None
+        for lane in cls.__lanes:
+            for deliveries in lane.values():
+                for delivery in deliveries:
+                    delivery.future.cancel()
+            lane.clear()
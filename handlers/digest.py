@@ -0,0 +1,112 @@
+"""Alert digests"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from config import settings
+from logger import LOGGER
+from schema.alert_schema import AlertRecipient
+from schema.kafka_schema import Transaction
+
+# Sends recipient transactions of wallet as one message to chats not in the set and adds chats it sent to
+DigestSender = Callable[[AlertRecipient, str, int, List[Transaction], Set[int]], Awaitable[None]]
+
+
+class DigestBuffer:
+    """Transactions collected for recipient during digest window"""
+
+    def __init__(self, recipient: AlertRecipient, wallet: str, blockchain_id: int, send: DigestSender):
+        self.recipient = recipient
+        self.wallet = wallet
+        self.blockchain_id = blockchain_id
+        self.send = send
+        self.transactions: List[Transaction] = []
+        self.task: Optional[asyncio.Task] = None
+        # Chats digest was sent to, retries skip them
+        self.sent: Set[int] = set()
+        self.attempt = 0
+
+
+class AlertDigest:
+    """
+    Alerts of clusters in digest mode. Transactions of the watched address are collected
+    for the cluster digest window and then sent as one message. Failed digests are sent again
+    with the retry policy backoff
+    """
+    __buffers: Dict[int, DigestBuffer] = {}
+    __retries: Set[DigestBuffer] = set()
+    __tasks: Set[asyncio.Task] = set()
+    __stopping = False
+
+    @classmethod
+    def add(cls, recipient: AlertRecipient, wallet: str, blockchain_id: int,
+            transactions: List[Transaction], send: DigestSender) -> None:
+        """
+        Collect alerted transactions. The first transaction starts recipient digest window
+        :param recipient: cluster watching address, the latest state is used for sending
+        :param wallet: alerted wallet
+        :param blockchain_id: wallet blockchain
+        :param transactions: alerted transactions
+        :param send: digest sending coroutine
+        """
+        buffer = cls.__buffers.get(recipient.link_id)
+        if buffer is None:
+            buffer = cls.__buffers[recipient.link_id] = DigestBuffer(recipient, wallet, blockchain_id, send)
+            buffer.task = asyncio.create_task(cls.send_later(recipient.link_id, recipient.digest_window))
+            cls.__tasks.add(buffer.task)
+            buffer.task.add_done_callback(cls.__tasks.discard)
+        buffer.recipient = recipient
+        buffer.send = send
+        buffer.transactions.extend(transactions)
+
+    @classmethod
+    async def send_later(cls, link_id: int, window: int) -> None:
+        """Send digest at the end of window"""
+        await asyncio.sleep(window)
+        await cls.send(link_id)
+
+    @classmethod
+    async def send(cls, link_id: int) -> None:
+        """Send collected transactions"""
+        buffer = cls.__buffers.pop(link_id, None)
+        if buffer is None or not buffer.transactions:
+            return
+        await cls.deliver(buffer)
+
+    @classmethod
+    async def deliver(cls, buffer: DigestBuffer) -> None:
+        """Send digest, schedule retry if it failed"""
+        try:
+            await buffer.send(buffer.recipient, buffer.wallet, buffer.blockchain_id, buffer.transactions, buffer.sent)
+        except Exception as e:
+            buffer.attempt += 1
+            LOGGER.error(f'Digest of {buffer.wallet} for cluster {buffer.recipient.cluster_id} '
+                         f'attempt {buffer.attempt} failed: {e}')
+            if buffer.attempt > settings.retry.max_attempts or cls.__stopping:
+                return
+            delay = min(settings.retry.backoff_s * 2 ** (buffer.attempt - 1), settings.retry.backoff_max_s)
+            cls.__retries.add(buffer)
+            buffer.task = asyncio.create_task(cls.retry_later(buffer, delay))
+            cls.__tasks.add(buffer.task)
+            buffer.task.add_done_callback(cls.__tasks.discard)
+
+    @classmethod
+    async def retry_later(cls, buffer: DigestBuffer, delay: float) -> None:
+        """Send failed digest again after delay"""
+        await asyncio.sleep(delay)
+        cls.__retries.discard(buffer)
+        await cls.deliver(buffer)
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Send all collected and failed digests without waiting for windows end and retry backoff"""
+        cls.__stopping = True
+        for buffer in list(cls.__buffers.values()) + list(cls.__retries):
+            # Digests being sent are not in buffers and are awaited below
+            buffer.task.cancel()
+        await asyncio.gather(*cls.__tasks, return_exceptions=True)
+        retries, cls.__retries = cls.__retries, set()
+        await asyncio.gather(
+            *(cls.send(link_id) for link_id in list(cls.__buffers)),
+            *(cls.deliver(buffer) for buffer in retries)
+        )
+        cls.__stopping = False
@@ -0,0 +1,114 @@
+"""Wallet graph edges cache"""
+import datetime
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Tuple
+
+from config import settings
+from handlers.async_database_handlers import AsyncTransactionHandler
+
+Edge = Tuple[str, str, float, datetime.datetime]
+
+# Approximate size of edge tuple, float and datetime without wallet strings
+EDGE_OVERHEAD = 200
+
+
+class EdgeCache:
+    """
+    Least recently used wallets graph edges. Wallet edges are loaded from database once
+    and then updated with every saved transaction. Total size is limited by graph.cache_mb
+    """
+    __wallets: 'OrderedDict[str, Deque[Edge]]' = OrderedDict()
+    __sizes: Dict[str, int] = {}
+    __size = 0
+    # (transaction id, edge) added while wallet is loaded from database, one buffer per running load
+    __loading: Dict[str, List[List[Tuple[int, Edge]]]] = {}
+
+    @staticmethod
+    def get_since() -> datetime.datetime:
+        """Returns the oldest date of graph window"""
+        return datetime.datetime.utcnow() - datetime.timedelta(days=settings.graph.window_days)
+
+    @staticmethod
+    def get_edge_size(edge: Edge) -> int:
+        """Returns approximate edge memory size"""
+        return len(edge[0]) + len(edge[1]) + EDGE_OVERHEAD
+
+    @classmethod
+    def put(cls, wallet: str, edges: List[Edge]) -> None:
+        """Cache wallet edges ordered by date"""
+        cls.remove(wallet)
+        cls.__wallets[wallet] = deque(edges, maxlen=settings.graph.max_edges)
+        cls.__sizes[wallet] = sum(cls.get_edge_size(x) for x in cls.__wallets[wallet])
+        cls.__size += cls.__sizes[wallet]
+        cls.evict()
+
+    @classmethod
+    def evict(cls) -> None:
+        """Drop least recently used wallets while cache is over graph.cache_mb"""
+        while cls.__size > settings.graph.cache_mb * 1024 * 1024 and len(cls.__wallets) > 1:
+            cls.remove(next(iter(cls.__wallets)))
+
+    @classmethod
+    def remove(cls, wallet: str) -> None:
+        """Drop wallet edges"""
+        if wallet in cls.__wallets:
+            del cls.__wallets[wallet]
+            cls.__size -= cls.__sizes.pop(wallet)
+
+    @classmethod
+    def add(cls, edges: List[Edge], ids: List[int]) -> None:
+        """
+        Append new transactions to cached graphs of both wallets
+        :param edges: saved transactions edges
+        :param ids: saved transactions ids
+        """
+        for transaction_id, edge in zip(ids, edges):
+            for wallet in {edge[0], edge[1]}:
+                for buffer in cls.__loading.get(wallet, []):
+                    buffer.append((transaction_id, edge))
+                cached = cls.__wallets.get(wallet)
+                if cached is None:
+                    continue
+                if len(cached) == cached.maxlen:
+                    cls.__sizes[wallet] -= cls.get_edge_size(cached[0])
+                    cls.__size -= cls.get_edge_size(cached[0])
+                cached.append(edge)
+                cls.__sizes[wallet] += cls.get_edge_size(edge)
+                cls.__size += cls.get_edge_size(edge)
+        cls.evict()
+
+    @staticmethod
+    def merge(rows: List[Tuple[int, str, str, float, datetime.datetime]], added: List[Tuple[int, Edge]]) -> List[Edge]:
+        """Append edges added during database query which the query result does not contain"""
+        loaded = {row[0] for row in rows}
+        return [row[1:] for row in rows] + [edge for transaction_id, edge in added if transaction_id not in loaded]
+
+    @classmethod
+    async def get(cls, wallet: str) -> List[Edge]:
+        """
+        Returns the newest wallet edges of graph window. Database is queried only if wallet is not cached
+        :param wallet: wallet address
+        :return: (source, destination, sum, date) ordered from old to new
+        """
+        since = cls.get_since()
+        cached = cls.__wallets.get(wallet)
+        if cached is None:
+            buffer = []
+            cls.__loading.setdefault(wallet, []).append(buffer)
+            try:
+                rows = await AsyncTransactionHandler().get_edges(wallet, since, settings.graph.max_edges)
+            finally:
+                buffers = [x for x in cls.__loading[wallet] if x is not buffer]
+                if buffers:
+                    cls.__loading[wallet] = buffers
+                else:
+                    del cls.__loading[wallet]
+            edges = cls.merge(rows, buffer)[-settings.graph.max_edges:]
+            cls.put(wallet, edges)
+            return edges
+        cls.__wallets.move_to_end(wallet)
+        while cached and cached[0][3] < since:
+            edge = cached.popleft()
+            cls.__sizes[wallet] -= cls.get_edge_size(edge)
+            cls.__size -= cls.get_edge_size(edge)
+        return list(cached)
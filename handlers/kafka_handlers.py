@@ -1,20 +1,64 @@
 """Kafka handlers module"""
+import asyncio
+import time
+from typing import List, Optional
 
 from aiogram import Bot
 from aiokafka import AIOKafkaConsumer, TopicPartition, AIOKafkaProducer
+from aiokafka.errors import KafkaError
 
 from config import settings
 from handlers.bot_handlers import NotificationHandler
-from handlers.database_handlers import AddressesHandler
+from handlers.async_database_handlers import AsyncAddressesHandler, BlockchainCache
+from handlers.kafka_workers import KeyedWorkerPool, OffsetTracker, TrackerRebalanceListener
 from logger import LOGGER
 from schema.kafka_schema import Outgoing, Incoming
 
 
+class SharedProducer:
+    """Process-wide kafka producer"""
+    __producer: Optional[AIOKafkaProducer] = None
+
+    @classmethod
+    async def start(cls) -> None:
+        """Create and start producer"""
+        if cls.__producer is not None:
+            return
+        producer = AIOKafkaProducer(
+            bootstrap_servers=[settings.kafka],
+            linger_ms=settings.producer.linger_ms,
+            max_batch_size=settings.producer.max_batch_size,
+            compression_type=settings.producer.compression_type
+        )
+        await producer.start()
+        cls.__producer = producer
+
+    @classmethod
+    async def stop(cls) -> None:
+        """Flush pending messages and stop producer"""
+        if cls.__producer is not None:
+            producer, cls.__producer = cls.__producer, None
+            await producer.stop()
+
+    @classmethod
+    async def send(cls, topic: str, value: bytes) -> None:
+        """Enqueue message to the producer batch"""
+        if cls.__producer is None:
+            await cls.start()
+        await cls.__producer.send(topic, value)
+
+    @classmethod
+    async def send_and_wait(cls, topic: str, value: bytes) -> None:
+        """Send message and wait until the broker stores it"""
+        if cls.__producer is None:
+            await cls.start()
+        await cls.__producer.send_and_wait(topic, value)
+
+
 async def send_data(action: str, wallet: str, blockchain_id: int, cluster_id: int = 0):
     """Send data to handler"""
-    handler = AddressesHandler()
     try:
-        blockchain = handler.get_blockchain_by_id(blockchain_id)
+        blockchain = await BlockchainCache.get(blockchain_id)
     except Exception as e:
         LOGGER.error(str(e))
     else:
@@ -25,24 +69,165 @@ async def send_data(action: str, wallet: str, blockchain_id: int, cluster_id: in
             blockchain=blockchain_id,
             cluster_id=cluster_id
         )
-        producer = AIOKafkaProducer(
-            bootstrap_servers=[settings.kafka]
+        await SharedProducer.send(topic, msg.json().encode('utf-8'))
+
+
+class RetryHandler:
+    """Delayed retry and dead-letter topics for failed notifications"""
+    retry_suffix = '_RETRY'
+    dead_letter_suffix = '_DLQ'
+
+    @classmethod
+    def get_base_topic(cls, topic: str) -> str:
+        """Returns blockchain topic for main or retry topic"""
+        if topic.endswith(cls.retry_suffix):
+            return topic[:-len(cls.retry_suffix)]
+        return topic
+
+    @staticmethod
+    def get_delay(attempt: int) -> float:
+        """Returns exponential backoff delay in seconds for attempt"""
+        return min(settings.retry.backoff_s * 2 ** (attempt - 1), settings.retry.backoff_max_s)
+
+    @classmethod
+    async def schedule(cls, topic: str, data: Incoming) -> None:
+        """
+        Send failed message to the retry topic or, when attempts are exhausted, to the dead-letter topic
+        :param topic: topic message was consumed from
+        :param data: failed message
+        """
+        data = data.copy(update={'attempt': data.attempt + 1})
+        base_topic = cls.get_base_topic(topic)
+        if data.attempt > settings.retry.max_attempts:
+            target = base_topic + cls.dead_letter_suffix
+        else:
+            target = base_topic + cls.retry_suffix
+            data.retry_at = time.time() + cls.get_delay(data.attempt)
+        # Source offset is committed after this, the message must be stored before
+        await SharedProducer.send_and_wait(target, data.json().encode('utf-8'))
+
+
+async def process_message(topic: str, data: Incoming, bot: Bot, handler: AsyncAddressesHandler) -> None:
+    """Handle notification. Failed notifications are sent to the retry topic"""
+    try:
+        await NotificationHandler.handle_notification(data, bot, handler)
+    except Exception as e:
+        LOGGER.error(f'{topic}: {data.wallet} attempt {data.attempt} failed: {e}')
+        await RetryHandler.schedule(topic, data)
+
+
+async def consume_batches(consumer: AIOKafkaConsumer, bot: Bot, handler: AsyncAddressesHandler):
+    """
+    Consume data from kafka in batches and commit offsets once per batch
+    :param consumer: started kafka consumer
+    :param bot: telegram bot
+    :param handler: addresses database handler
+    """
+    while True:
+        batch = await consumer.getmany(
+            timeout_ms=settings.consumer.max_wait_ms,
+            max_records=settings.consumer.max_batch_size
         )
-        await producer.start()
-        try:
-            await producer.send(topic, msg.json().encode('utf-8'))
-        finally:
-            await producer.stop()
+        offsets = {}
+        for tp, messages in batch.items():
+            incoming = []
+            for message in messages:
+                try:
+                    incoming.append((message.offset, Incoming.parse_raw(message.value)))
+                except Exception as e:
+                    LOGGER.error(f'{tp.topic}:{tp.partition}:{message.offset} skipped: {e}')
+                    incoming.append((message.offset, None))
+
+            for offset, data in incoming:
+                if data is not None:
+                    try:
+                        await process_message(tp.topic, data, bot, handler)
+                    except Exception as e:
+                        LOGGER.error(str(e))
+                        # Retry topic is unavailable, redeliver the message and everything after it
+                        consumer.seek(tp, offset)
+                        await asyncio.sleep(settings.retry.backoff_s)
+                        break
+                offsets[tp] = offset + 1
+        if offsets:
+            await consumer.commit(offsets)
+
+
+async def consume_concurrently(consumer: AIOKafkaConsumer, topics: List[str], bot: Bot,
+                               handler: AsyncAddressesHandler):
+    """
+    Consume data from kafka and process messages in a worker pool.
+    Messages of the same wallet are processed in order, offsets are committed
+    only when all earlier messages of the partition are processed
+    :param consumer: started kafka consumer
+    :param topics: topics to subscribe
+    :param bot: telegram bot
+    :param handler: addresses database handler
+    """
+    pool = KeyedWorkerPool(settings.consumer.workers, settings.consumer.worker_queue_size)
+    tracker = OffsetTracker()
+
+    def make_job(data: Incoming, tp: TopicPartition, offset: int):
+        async def job():
+            if not tracker.is_pending(tp, offset):
+                # Partition was rewound or revoked, the message will be delivered again
+                return
+            running = tracker.started(tp)
+            try:
+                await process_message(tp.topic, data, bot, handler)
+            except Exception:
+                # Retry topic is unavailable, redeliver the message and everything after it
+                tracker.failed(tp, offset)
+                raise
+            finally:
+                running.set_result(None)
+            tracker.done(tp, offset)
+        return job
+
+    consumer.subscribe(topics, listener=TrackerRebalanceListener(tracker))
+    pool.start()
+    try:
+        while True:
+            batch = await consumer.getmany(
+                timeout_ms=settings.consumer.max_wait_ms,
+                max_records=settings.consumer.max_batch_size
+            )
+            for tp, messages in batch.items():
+                for message in messages:
+                    if tp not in consumer.assignment():
+                        # Partition was revoked while the worker queue was full
+                        break
+                    tracker.add(tp, message.offset)
+                    try:
+                        data = Incoming.parse_raw(message.value)
+                    except Exception as e:
+                        LOGGER.error(f'{tp.topic}:{tp.partition}:{message.offset} skipped: {e}')
+                        tracker.done(tp, message.offset)
+                        continue
+                    await pool.submit((data.blockchain, data.wallet), make_job(data, tp, message.offset))
+
+            for tp, offset in tracker.rewind().items():
+                consumer.seek(tp, offset)
+            assignment = consumer.assignment()
+            offsets = {tp: offset for tp, offset in tracker.committable().items() if tp in assignment}
+            if offsets:
+                try:
+                    await consumer.commit(offsets)
+                except KafkaError as e:
+                    # Group is rebalancing, offsets are committed again after it
+                    LOGGER.error(f'Commit failed: {e}')
+                else:
+                    tracker.committed(offsets)
     finally:
-        handler.session.dispose()
+        await pool.stop()
 
 
 async def consume_data(bot: Bot):
     """Consume data from kafka"""
-    handler = AddressesHandler()
-    topics = [x.tag for x in handler.get_blockchains()]
+    handler = AsyncAddressesHandler()
+    await handler.load_subscriptions()
+    topics = [x.tag for x in await handler.get_blockchains()]
     consumer = AIOKafkaConsumer(
-        *topics,
         bootstrap_servers=[settings.kafka],
         auto_offset_reset='latest',
         enable_auto_commit=False,
@@ -51,16 +236,84 @@ async def consume_data(bot: Bot):
     )
     await consumer.start()
     try:
-        async for message in consumer:
-            result = await NotificationHandler.handle_notification(Incoming.parse_raw(message.value), bot, handler)
-            if result:
-                #await send_data('delete_address', result.wallet, result.blockchain)
-                pass
-            tp = TopicPartition(message.topic, message.partition)
-            await consumer.commit({tp: message.offset + 1})
+        if settings.consumer.workers > 1:
+            await consume_concurrently(consumer, topics, bot, handler)
+        elif settings.consumer.batch_mode:
+            consumer.subscribe(topics)
+            await consume_batches(consumer, bot, handler)
+        else:
+            consumer.subscribe(topics)
+            async for message in consumer:
+                tp = TopicPartition(message.topic, message.partition)
+                try:
+                    data = Incoming.parse_raw(message.value)
+                except Exception as e:
+                    LOGGER.error(f'{message.topic}:{message.partition}:{message.offset} skipped: {e}')
+                else:
+                    try:
+                        await process_message(message.topic, data, bot, handler)
+                    except Exception as e:
+                        LOGGER.error(str(e))
+                        # Retry topic is unavailable, redeliver the message after a pause
+                        consumer.seek(tp, message.offset)
+                        await asyncio.sleep(settings.retry.backoff_s)
+                        continue
+                await consumer.commit({tp: message.offset + 1})
+    except Exception as e:
+        LOGGER.error(str(e))
+    finally:
+        await consumer.stop()
+
+
+async def consume_retries(bot: Bot):
+    """
+    Consume retry topics. Messages are processed when their backoff expires,
+    partition is paused until then so the other partitions are not blocked
+    """
+    handler = AsyncAddressesHandler()
+    topics = [x.tag + RetryHandler.retry_suffix for x in await handler.get_blockchains()]
+    consumer = AIOKafkaConsumer(
+        *topics,
+        bootstrap_servers=[settings.kafka],
+        auto_offset_reset='earliest',
+        enable_auto_commit=False,
+        group_id='BOT_1_RETRY',
+        value_deserializer=lambda x: str(x.decode('utf-8')),
+    )
+
+    def resume(tp: TopicPartition):
+        if tp in consumer.assignment():
+            consumer.resume(tp)
+
+    loop = asyncio.get_running_loop()
+    await consumer.start()
+    try:
+        while True:
+            batch = await consumer.getmany(timeout_ms=settings.consumer.max_wait_ms)
+            for tp, messages in batch.items():
+                for message in messages:
+                    try:
+                        data = Incoming.parse_raw(message.value)
+                    except Exception as e:
+                        LOGGER.error(f'{tp.topic}:{tp.partition}:{message.offset} skipped: {e}')
+                    else:
+                        delay = (data.retry_at or 0) - time.time()
+                        if delay > 0:
+                            consumer.seek(tp, message.offset)
+                            consumer.pause(tp)
+                            loop.call_later(delay, resume, tp)
+                            break
+                        try:
+                            await process_message(tp.topic, data, bot, handler)
+                        except Exception as e:
+                            LOGGER.error(str(e))
+                            # Retry topic is unavailable, redeliver the message after a pause
+                            consumer.seek(tp, message.offset)
+                            consumer.pause(tp)
+                            loop.call_later(settings.retry.backoff_s, resume, tp)
+                            break
+                    await consumer.commit({tp: message.offset + 1})
     except Exception as e:
         LOGGER.error(str(e))
     finally:
-        handler.session.dispose()
         await consumer.stop()
-    del handler
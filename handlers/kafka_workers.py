@@ -0,0 +1,136 @@
+"""Concurrent kafka message processing"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Set
+
+from aiokafka import ConsumerRebalanceListener, TopicPartition
+
+from logger import LOGGER
+
+
+class OffsetTracker:
+    """Tracks in-flight offsets per partition and returns only offsets safe to commit"""
+
+    def __init__(self):
+        self._pending: Dict[TopicPartition, Set[int]] = {}
+        self._high: Dict[TopicPartition, int] = {}
+        self._committed: Dict[TopicPartition, int] = {}
+        self._failed: Dict[TopicPartition, int] = {}
+        self._running: Dict[TopicPartition, Set[asyncio.Future]] = {}
+
+    def add(self, tp: TopicPartition, offset: int) -> None:
+        """Register dispatched message"""
+        self._pending.setdefault(tp, set()).add(offset)
+        self._high.setdefault(tp, offset)
+
+    def done(self, tp: TopicPartition, offset: int) -> None:
+        """Mark message as processed. Messages dropped by rewind are ignored"""
+        pending = self._pending.get(tp, set())
+        if offset in pending:
+            pending.discard(offset)
+            self._high[tp] = max(self._high.get(tp, 0), offset + 1)
+
+    def is_pending(self, tp: TopicPartition, offset: int) -> bool:
+        """Returns False for messages dropped by rewind"""
+        return offset in self._pending.get(tp, set())
+
+    def failed(self, tp: TopicPartition, offset: int) -> None:
+        """Mark message as failed, partition is not committed past it. Messages dropped by rewind are ignored"""
+        if self.is_pending(tp, offset):
+            self._failed[tp] = min(self._failed.get(tp, offset), offset)
+
+    def rewind(self) -> Dict[TopicPartition, int]:
+        """
+        Returns offsets of the earliest failed message for partitions to seek back.
+        The failed and later messages of these partitions are forgotten until they are delivered again
+        """
+        failed, self._failed = self._failed, {}
+        for tp, offset in failed.items():
+            self._pending[tp] = {x for x in self._pending.get(tp, set()) if x < offset}
+            self._high[tp] = offset
+        return failed
+
+    def committable(self) -> Dict[TopicPartition, int]:
+        """
+        Returns offsets to commit: for every partition the offset of the earliest message
+        still in progress, or the next offset after the last processed one if nothing is pending
+        """
+        offsets = {}
+        for tp, high in self._high.items():
+            pending = self._pending.get(tp)
+            offset = min(pending) if pending else high
+            if offset > self._committed.get(tp, -1):
+                offsets[tp] = offset
+        return offsets
+
+    def committed(self, offsets: Dict[TopicPartition, int]) -> None:
+        """Remember committed offsets"""
+        self._committed.update(offsets)
+
+    def started(self, tp: TopicPartition) -> asyncio.Future:
+        """Register running job of partition, the returned future must be resolved when the job ends"""
+        future = asyncio.get_running_loop().create_future()
+        self._running.setdefault(tp, set()).add(future)
+        future.add_done_callback(self._running[tp].discard)
+        return future
+
+    def revoke(self, partitions: Iterable[TopicPartition]) -> List[asyncio.Future]:
+        """
+        Forget revoked partitions, their queued jobs are skipped
+        :return: futures of running jobs of the partitions
+        """
+        running = []
+        for tp in partitions:
+            for state in (self._pending, self._high, self._committed, self._failed):
+                state.pop(tp, None)
+            running.extend(self._running.get(tp, ()))
+        return running
+
+
+class TrackerRebalanceListener(ConsumerRebalanceListener):
+    """Drops tracker state of revoked partitions and waits for their running jobs"""
+
+    def __init__(self, tracker: OffsetTracker):
+        self._tracker = tracker
+
+    async def on_partitions_revoked(self, revoked: Set[TopicPartition]) -> None:
+        running = self._tracker.revoke(revoked)
+        if running:
+            await asyncio.wait(running)
+
+    async def on_partitions_assigned(self, assigned: Set[TopicPartition]) -> None:
+        pass
+
+
+class KeyedWorkerPool:
+    """Pool of workers. Jobs with the same key are processed by the same worker in submit order"""
+
+    def __init__(self, size: int, queue_size: int):
+        self._queues: List[asyncio.Queue] = [asyncio.Queue(maxsize=queue_size) for _ in range(size)]
+        self._workers: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Start workers"""
+        self._workers = [asyncio.create_task(self._work(queue)) for queue in self._queues]
+
+    async def submit(self, key: Hashable, job: Callable[[], Awaitable]) -> None:
+        """Put job to worker queue. Waits while the worker queue is full"""
+        await self._queues[hash(key) % len(self._queues)].put(job)
+
+    async def stop(self) -> None:
+        """Cancel workers"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @staticmethod
+    async def _work(queue: asyncio.Queue) -> None:
+        """Worker loop"""
+        while True:
+            job = await queue.get()
+            try:
+                await job()
+            except Exception as e:
+                LOGGER.error(str(e))
+            finally:
+                queue.task_done()
@@ -1,24 +1,34 @@
 import asyncio
 
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 from aiogram.bot.bot import Bot
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.dispatcher.dispatcher import Dispatcher
 from aiogram.dispatcher.filters import Command
+from aiogram.dispatcher.webhook import get_new_configured_app
+from aiohttp import web
 
 from callbacks.addresses import get_address, get_blockchain, get_name, handle_address_detail, \
     handle_rename_address, handle_rename_address_set_name, handle_mute_address, handle_delete_address
 from callbacks.base import handle_cancel, handle_start
 from callbacks.clusters import handle_cluster_detail, add_group, handle_rename_cluster_set_name, \
     handle_rename_cluster, handle_view_cluster_addresses, handle_mute_cluster, handle_delete_cluster, \
-    handle_add_address, handle_back_to_cluster
+    handle_add_address, handle_back_to_cluster, handle_digest_cluster
 from callbacks.main_menu import handle_help, handle_profile, handle_groups, handle_group_add, \
     handle_alert_history_csv, handle_choose_cluster, handle_add_address_main
 from config import settings
-from handlers.kafka_handlers import consume_data
+from database.factory import DatabaseFactory
+from graphs.layout import LayoutCache
+from graphs.render_service import RenderService
+from handlers.billing import BillingLedger
+from handlers.delivery import DeliveryScheduler
+from handlers.digest import AlertDigest
+from handlers.kafka_handlers import consume_data, consume_retries, SharedProducer
 from handlers.handler_filters import CallbackDataActionFilter
 from handlers.states import AddClusterState, RenameClusterState, AddAddressState, RenameAddressState
 
-bot = Bot(token=settings.TOKEN, parse_mode='HTML',disable_web_page_preview=True)
+server = TelegramAPIServer.from_base(settings.api_server) if settings.api_server else TELEGRAM_PRODUCTION
+bot = Bot(token=settings.TOKEN, parse_mode='HTML',disable_web_page_preview=True, server=server)
 
 storage = MemoryStorage()
 disp = Dispatcher(bot=bot, storage=storage)
@@ -39,6 +49,7 @@ disp.register_callback_query_handler(handle_rename_cluster, CallbackDataActionFi
 disp.register_callback_query_handler(handle_view_cluster_addresses, CallbackDataActionFilter(action='view_addresses'))
 disp.register_callback_query_handler(handle_mute_cluster, CallbackDataActionFilter(action='toggle_mute_cluster'))
 disp.register_callback_query_handler(handle_delete_cluster, CallbackDataActionFilter(action='delete_cluster'))
+disp.register_callback_query_handler(handle_digest_cluster, CallbackDataActionFilter(action='toggle_digest_cluster'))
 disp.register_callback_query_handler(handle_add_address, CallbackDataActionFilter(action='add_address'))
 disp.register_callback_query_handler(handle_back_to_cluster, CallbackDataActionFilter(action='back_to_cluster'))
 disp.register_message_handler(get_address, state=AddAddressState.wallet)
@@ -52,14 +63,60 @@ disp.register_callback_query_handler(handle_mute_address, CallbackDataActionFilt
 disp.register_callback_query_handler(handle_delete_address, CallbackDataActionFilter(action='delete_address'))
 
 
+@web.middleware
+async def check_secret_token(request: web.Request, handler):
+    """Reject webhook requests without the secret token set for the webhook"""
+    if request.headers.get('X-Telegram-Bot-Api-Secret-Token') != settings.webhook.secret_token:
+        return web.Response(status=403)
+    return await handler(request)
+
+
+async def run_webhook():
+    """Receive updates by webhook in the bot event loop until cancelled"""
+    app = get_new_configured_app(disp, settings.webhook.path)
+    if settings.webhook.secret_token:
+        app.middlewares.append(check_secret_token)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, settings.webhook.host, settings.webhook.port).start()
+        await bot.set_webhook(
+            settings.webhook.url.rstrip('/') + settings.webhook.path,
+            secret_token=settings.webhook.secret_token
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def run_polling():
+    """Receive updates by long polling"""
+    # Updates can't be polled while webhook is set
+    await bot.delete_webhook()
+    await disp.start_polling(disp)
+
+
 async def main():
+    await SharedProducer.start()
+    BillingLedger.start()
+    DeliveryScheduler.start()
+    RenderService.start()
+    LayoutCache.load()
     try:
         await asyncio.gather(
-            disp.start_polling(disp),
-            consume_data(bot)
+            run_webhook() if settings.webhook.url else run_polling(),
+            consume_data(bot),
+            consume_retries(bot)
         )
     finally:
         disp.stop_polling()
+        await AlertDigest.stop()
+        await DeliveryScheduler.stop()
+        await BillingLedger.stop()
+        RenderService.stop()
+        LayoutCache.save()
+        await SharedProducer.stop()
+        await DatabaseFactory.dispose_all()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,45 @@
+"""Alert data models"""
+import datetime
+from decimal import Decimal
+from typing import List, Optional, Set
+
+from pydantic import BaseModel
+
+
+class AlertUser(BaseModel):
+    """Recipient owner state. One instance is shared by all recipients of the user"""
+    id: int
+    is_active: bool
+    created_at: Optional[datetime.datetime]
+    notifications_remain: int
+    notification_cost: Decimal
+
+    class Config:
+        copy_on_model_validation = 'none'
+
+
+class AlertRecipient(BaseModel):
+    """Cluster watching an address with its owner state and chats"""
+    link_id: int
+    address_name: str
+    cluster_id: int
+    cluster_name: str
+    cluster_watch: bool
+    user: AlertUser
+    chats: List[int]
+    wallets: Set[str]
+    digest_window: int = 0
+
+    @property
+    def send_allowed(self) -> bool:
+        """Returns True if alert can be sent to recipient chats"""
+        return all([self.cluster_watch, self.user.is_active, self.user.notifications_remain > 0])
+
+
+class Subscription(BaseModel):
+    """Watched address with all clusters watching it"""
+    address_id: int
+    wallet: str
+    blockchain_id: int
+    add_success: Optional[bool]
+    recipients: List[AlertRecipient]
@@ -1,5 +1,5 @@
 """Kafka data models"""
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from pydantic import BaseModel
 
@@ -31,3 +31,9 @@ class Incoming(BaseModel):
     wallet: str
     transactions: List[Transaction]
     auto_add: List[str]
+    attempt: int = 0
+    retry_at: Optional[float]
+    # Transactions are saved to database, retries only send alerts
+    stored: bool = False
+    # (recipient link, chat, transaction index) already sent, retries skip them
+    delivered: List[Tuple[int, int, int]] = []
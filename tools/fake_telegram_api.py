@@ -0,0 +1,162 @@
+"""
+Fake Telegram Bot API server for running the bot locally.
+
+Answers Bot API methods with plausible results, records the webhook set by the bot and,
+with --updates, pushes user messages to the webhook and reports how long the bot takes to reply.
+
+    python tools/fake_telegram_api.py --port 8081 --updates 20
+
+config.json of the bot:
+
+    "api_server": "http://localhost:8081",
+    "webhook": {"url": "http://localhost:8080", "path": "/webhook"}
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import ClientSession, web
+
+BOT_USER = {'id': 1000, 'is_bot': True, 'first_name': 'BTrace', 'username': 'btrace_test_bot'}
+USER = {'id': 2000, 'is_bot': False, 'first_name': 'Test', 'username': 'tester'}
+MESSAGE_METHODS = {
+    'sendmessage', 'sendphoto', 'senddocument', 'editmessagetext', 'editmessagereplymarkup', 'editmessagecaption'
+}
+
+
+class FakeTelegramAPI:
+    """Bot API state: webhook, sent messages and replies awaited by pushed updates"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.webhook: Optional[str] = None
+        self.secret_token: Optional[str] = None
+        self.webhook_set = asyncio.Event()
+        self.ids = itertools.count(1)
+        self.replies: Dict[int, asyncio.Future] = {}
+        self.calls: Dict[str, int] = {}
+
+    def get_message(self, method: str, params: dict) -> dict:
+        """Returns message sent by the bot"""
+        chat_id = int(params.get('chat_id', USER['id']))
+        message = {
+            'message_id': int(params.get('message_id', 0)) or next(self.ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+            'from': BOT_USER,
+        }
+        if method == 'sendphoto':
+            file_id = params['photo'] if isinstance(params.get('photo'), str) else f'photo{next(self.ids)}'
+            message['photo'] = [
+                {'file_id': f'{file_id}-small', 'file_unique_id': f'{file_id}-s', 'width': 320, 'height': 224},
+                {'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 896},
+            ]
+            message['caption'] = params.get('caption')
+        elif method == 'senddocument':
+            message['document'] = {'file_id': f'document{next(self.ids)}', 'file_unique_id': f'd{next(self.ids)}'}
+        else:
+            message['text'] = params.get('text', '')
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Bot API method"""
+        method = request.match_info['method'].lower()
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = {k: v if isinstance(v, str) else v.file for k, v in (await request.post()).items()}
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == 'getme':
+            result = BOT_USER
+        elif method == 'setwebhook':
+            self.webhook = params['url']
+            self.secret_token = params.get('secret_token')
+            self.webhook_set.set()
+            result = True
+        elif method == 'deletewebhook':
+            self.webhook = None
+            self.webhook_set.clear()
+            result = True
+        elif method == 'getupdates':
+            await asyncio.sleep(min(float(params.get('timeout', 0) or 0), 1))
+            result = []
+        elif method in MESSAGE_METHODS:
+            result = self.get_message(method, params)
+            reply = self.replies.pop(int(result['chat']['id']), None)
+            if reply is not None and not reply.done():
+                reply.set_result(time.perf_counter())
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def push_updates(self, count: int, interval: float) -> List[float]:
+        """Send user messages to the webhook, returns seconds until the bot replied to each one"""
+        await self.webhook_set.wait()
+        headers = {'X-Telegram-Bot-Api-Secret-Token': self.secret_token} if self.secret_token else {}
+        latencies = []
+        async with ClientSession() as session:
+            for i in range(count):
+                chat_id = USER['id'] + i
+                update = {
+                    'update_id': next(self.ids),
+                    'message': {
+                        'message_id': next(self.ids),
+                        'date': int(time.time()),
+                        'chat': {'id': chat_id, 'type': 'private'},
+                        'from': dict(USER, id=chat_id),
+                        'text': self.text,
+                    }
+                }
+                reply = self.replies[chat_id] = asyncio.get_running_loop().create_future()
+                started = time.perf_counter()
+                async with session.post(self.webhook, data=json.dumps(update), headers=headers,
+                                        timeout=60) as response:
+                    if response.status != 200:
+                        print(f'webhook answered {response.status}')
+                try:
+                    latencies.append(await asyncio.wait_for(reply, 10) - started)
+                except asyncio.TimeoutError:
+                    print(f'no reply to update {i}')
+                await asyncio.sleep(interval)
+        return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Fake Telegram Bot API server')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--updates', type=int, default=0, help='user messages to push once the webhook is set')
+    parser.add_argument('--interval', type=float, default=0.2, help='seconds between pushed messages')
+    parser.add_argument('--text', default='❓Help', help='text of pushed messages')
+    args = parser.parse_args()
+
+    api = FakeTelegramAPI(args.text)
+    app = web.Application()
+    app.router.add_route('*', '/bot{token}/{method}', api.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f'Fake Telegram API on http://{args.host}:{args.port}')
+    try:
+        if args.updates:
+            latencies = await api.push_updates(args.updates, args.interval)
+            print(f'webhook: {api.webhook}')
+            if latencies:
+                print(f'replies: {len(latencies)}/{args.updates}  median {statistics.median(latencies) * 1000:.1f} ms  '
+                      f'max {max(latencies) * 1000:.1f} ms')
+            print(f'calls: {api.calls}')
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,101 @@
+"""
+Benchmark of graph image profiles.
+
+Renders random graphs of several sizes with every configured render profile and with the previous
+fixed 250 dpi JPEG output, and prints rasterization time, encoding time, image size and upload bytes.
+
+    python tools/render_benchmark.py
+    python tools/render_benchmark.py --sizes 5 20 60 --repeat 5
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matplotlib import style
+from PIL import Image
+
+from config import settings, RenderProfile
+from graphs.graph import Graph
+from graphs.layout import LayoutCache
+from graphs.render_service import init_worker, get_figure, rasterize, encode_image
+
+
+def get_graph(nodes: int):
+    """Returns random wallet graph with given number of counterparties and its layout"""
+    wallet = f'wallet{nodes}'
+    edges = [
+        (wallet, f'counterparty{i}', random.random() * 100) if random.random() < 0.5
+        else (f'counterparty{i}', wallet, random.random() * 100)
+        for i in range(nodes)
+    ]
+    graph = Graph.simplify(Graph.aggregate(edges), settings.graph.draw_edges, settings.graph.draw_nodes)
+    positions = LayoutCache.get_positions(wallet, [node for pair in zip(graph.src, graph.dst) for node in pair])
+    return graph, positions
+
+
+def draw(graph, positions):
+    """Draw graph on the worker figure"""
+    figure = get_figure()
+    with style.context('mpl20'):
+        ax = figure.add_subplot()
+        ax.axis('off')
+        Graph().draw(graph, positions, ax)
+    return figure
+
+
+def measure_profile(graph, positions, profile: RenderProfile):
+    """Returns rasterize seconds, encode seconds and encoded image"""
+    figure = draw(graph, positions)
+    started = time.perf_counter()
+    try:
+        image = rasterize(figure, profile)
+    finally:
+        figure.clear()
+    rasterized = time.perf_counter()
+    data = encode_image(image, profile)
+    return rasterized - started, time.perf_counter() - rasterized, data
+
+
+def measure_legacy(graph, positions):
+    """Returns timings of the previous output: JPEG at 250 dpi straight from matplotlib"""
+    figure = draw(graph, positions)
+    started = time.perf_counter()
+    buffer = io.BytesIO()
+    try:
+        figure.savefig(buffer, format='jpg', dpi=250, bbox_inches='tight')
+    finally:
+        figure.clear()
+    return time.perf_counter() - started, 0.0, buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Graph image profiles benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 12, 30, 80], help='counterparties per graph')
+    parser.add_argument('--repeat', type=int, default=3, help='renders per graph and profile')
+    args = parser.parse_args()
+
+    random.seed(0)
+    init_worker()
+    variants = [(f'{x.format} <={x.max_nodes}', x) for x in settings.render.profiles] + [('legacy jpg 250dpi', None)]
+    print(f'{"nodes":>6}  {"profile":<18} {"raster s":>9} {"encode s":>9} {"pixels":>11} {"bytes":>9}')
+    for size in args.sizes:
+        graph, positions = get_graph(size)
+        for name, profile in variants:
+            results = [
+                measure_legacy(graph, positions) if profile is None else measure_profile(graph, positions, profile)
+                for _ in range(args.repeat)
+            ]
+            data = results[-1][2]
+            width, height = Image.open(io.BytesIO(data)).size
+            print(f'{len(positions):>6}  {name:<18} {statistics.median(x[0] for x in results):9.3f} '
+                  f'{statistics.median(x[1] for x in results):9.3f} {f"{width}x{height}":>11} {len(data):>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Soak test of graph rendering memory.
+
+Renders many random graphs in the current process the same way render workers do
+and fails if resident memory keeps growing after warm-up.
+
+    python tools/render_soak.py
+    python tools/render_soak.py --count 5000 --no-reuse
+"""
+import argparse
+import ctypes
+import gc
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import settings
+from graphs.graph import Graph
+from graphs.layout import LayoutCache
+from graphs.render_service import init_worker, render_graph
+
+
+def get_rss_mb() -> float:
+    """Returns current resident memory of the process"""
+    gc.collect()
+    try:
+        # Return freed render buffers to the system so only live memory is counted
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        # Peak memory where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_graph(index: int, max_nodes: int):
+    """Returns random wallet graph and its layout"""
+    wallet = f'wallet{index % 50}'
+    counterparties = [f'counterparty{random.randint(0, max_nodes * 5)}' for _ in range(random.randint(1, max_nodes))]
+    edges = [
+        (wallet, x, random.random() * 100) if random.random() < 0.5 else (x, wallet, random.random() * 100)
+        for x in counterparties
+    ]
+    graph = Graph.simplify(Graph.aggregate(edges), settings.graph.draw_edges, settings.graph.draw_nodes)
+    nodes = [node for pair in zip(graph.src, graph.dst) for node in pair]
+    return graph, LayoutCache.get_positions(wallet, nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Graph rendering memory soak test')
+    parser.add_argument('--count', type=int, default=2000, help='number of renders')
+    parser.add_argument('--warmup', type=int, default=50, help='renders before the baseline is taken')
+    parser.add_argument('--nodes', type=int, default=60, help='max counterparties per graph')
+    parser.add_argument('--max-growth-mb', type=float, default=30, help='allowed memory growth after warm-up')
+    parser.add_argument('--no-reuse', action='store_true', help='create a new figure for every render')
+    args = parser.parse_args()
+
+    settings.render.reuse_figure = not args.no_reuse
+    random.seed(0)
+    init_worker()
+    baseline = None
+    started = time.perf_counter()
+    for i in range(1, args.count + 1):
+        render_graph(*get_graph(i, args.nodes))
+        if i == args.warmup:
+            baseline = get_rss_mb()
+        if i % 100 == 0 or i == args.count:
+            print(f'{i:>6} renders  {get_rss_mb():8.1f} MB  {(time.perf_counter() - started) / i:.3f} s/render')
+
+    growth = get_rss_mb() - (baseline or get_rss_mb())
+    print(f'memory growth after warm-up: {growth:.1f} MB')
+    if growth > args.max_growth_mb:
+        print(f'FAIL: more than {args.max_growth_mb} MB')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""cluster digest window
+
+Revision ID: 5e8a1c3f7d24
+Revises: c41f7d2b9e60
+Create Date: 2026-10-18 16:40:12.518206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = '5e8a1c3f7d24'
+down_revision = 'c41f7d2b9e60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('clusters', sa.Column(
+        'digest_window', mysql.SMALLINT(unsigned=True), nullable=False, server_default='0'
+    ))
+
+
+def downgrade() -> None:
+    op.drop_column('clusters', 'digest_window')
@@ -0,0 +1,108 @@
+"""hot path indexes
+
+Revision ID: c41f7d2b9e60
+Revises: 3a2cb585f244
+Create Date: 2026-10-18 10:12:41.203518
+
+"""
+from typing import List
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = 'c41f7d2b9e60'
+down_revision = '3a2cb585f244'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('transactions', 'ix_transactions_wallet_1_id', ['wallet_1', 'id']),
+    ('transactions', 'ix_transactions_wallet_2_id', ['wallet_2', 'id']),
+    ('alert_history', 'ix_alert_history_user_id', ['user_id']),
+    ('clusters_addresses', 'ix_clusters_addresses_address_cluster', ['address_id', 'cluster_id']),
+    ('clusters_addresses', 'ix_clusters_addresses_cluster_address', ['cluster_id', 'address_id']),
+)
+FOREIGN_KEY_COLUMNS = {
+    'alert_history': ['user_id'],
+    'clusters_addresses': ['address_id', 'cluster_id'],
+}
+UNIQUE_ADDRESS = 'uq_addresses_wallet_blockchain'
+
+
+def get_index_names(table: str) -> List[str]:
+    """Returns names of table indexes and unique constraints"""
+    inspector = sa.inspect(op.get_bind())
+    return [x['name'] for x in inspector.get_indexes(table) + inspector.get_unique_constraints(table)]
+
+
+def is_covered(table: str, column: str, exclude: str) -> bool:
+    """Check if any index of the table except excluded one starts with column"""
+    inspector = sa.inspect(op.get_bind())
+    for index in inspector.get_indexes(table) + inspector.get_unique_constraints(table):
+        if index['name'] != exclude and index['column_names'][:1] == [column]:
+            return True
+    return False
+
+
+def merge_duplicate_addresses() -> None:
+    """Point clusters to the first of duplicated addresses and delete the rest"""
+    duplicates = """
+        SELECT wallet, blockchain_id, MIN(id) AS keep_id FROM addresses
+        WHERE blockchain_id IS NOT NULL
+        GROUP BY wallet, blockchain_id HAVING COUNT(*) > 1
+    """
+    op.execute(f"""
+        UPDATE clusters_addresses ca
+        JOIN addresses a ON a.id = ca.address_id
+        JOIN ({duplicates}) d ON d.wallet = a.wallet AND d.blockchain_id = a.blockchain_id
+        SET ca.address_id = d.keep_id
+        WHERE a.id <> d.keep_id
+    """)
+    op.execute(f"""
+        DELETE a FROM addresses a
+        JOIN ({duplicates}) d ON d.wallet = a.wallet AND d.blockchain_id = a.blockchain_id
+        WHERE a.id <> d.keep_id
+    """)
+
+
+def upgrade() -> None:
+    # Table was created outside of migrations on some installations
+    if not sa.inspect(op.get_bind()).has_table('transactions'):
+        op.create_table('transactions',
+        sa.Column('id', mysql.BIGINT(unsigned=True), nullable=False),
+        sa.Column('wallet_1', mysql.VARCHAR(length=100), nullable=False),
+        sa.Column('wallet_2', mysql.VARCHAR(length=100), nullable=False),
+        sa.Column('blockchain', mysql.VARCHAR(length=100), nullable=False),
+        sa.Column('balance', mysql.FLOAT(), nullable=False),
+        sa.Column('date', mysql.DATETIME(), nullable=True),
+        sa.Column('direction', mysql.VARCHAR(length=100), nullable=False),
+        sa.Column('token', mysql.VARCHAR(length=100), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    for table, name, columns in INDEXES:
+        if name not in get_index_names(table):
+            op.create_index(name, table, columns)
+
+    # Tables created from models never had the constraint
+    unique_constraints = sa.inspect(op.get_bind()).get_unique_constraints('addresses')
+    if not any(x['column_names'] == ['wallet', 'blockchain_id'] for x in unique_constraints):
+        merge_duplicate_addresses()
+        op.create_unique_constraint(UNIQUE_ADDRESS, 'addresses', ['wallet', 'blockchain_id'])
+
+
+def downgrade() -> None:
+    if UNIQUE_ADDRESS in get_index_names('addresses'):
+        op.drop_constraint(UNIQUE_ADDRESS, 'addresses', type_='unique')
+
+    for table, name, columns in reversed(INDEXES):
+        if name not in get_index_names(table):
+            continue
+        # MySQL drops its own foreign key index when another index covers the column,
+        # so it has to be restored before the covering index can be dropped
+        column = columns[0]
+        if column in FOREIGN_KEY_COLUMNS.get(table, []) and not is_covered(table, column, name):
+            op.create_index(column, table, [column])
+        op.drop_index(name, table)